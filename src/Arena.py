@@ -0,0 +1,180 @@
+# File: Arena.py
+# The physics world shared by the windowed game and headless simulations
+
+import pymunk as pm
+import Character
+import Collision
+import Debris
+import Snapshot
+import Stepper
+
+ARENA_SIZE = (800, 800)
+FPS = 50
+# Substeps per frame; the stepper only goes up to ITERATIONS while something moves fast
+MIN_SUBSTEPS = 3
+ITERATIONS = 25
+# Bodies slower than IDLE_SPEED pixels a second for SLEEP_TIME seconds fall asleep and aren't solved
+# until something touches them. The fighters sway on their leg springs, so this mostly rests debris.
+SLEEP_TIME = 0.5
+IDLE_SPEED = 10.0
+
+# Limbs that carry a health value, keyed by the attribute name on a fighter
+HEALTH_LIMBS = ("torso", "rElbow", "lElbow", "rKnee", "lKnee")
+
+
+def createSpace():
+    space = pm.Space()
+    space.gravity = (0.0, -1900.0)
+    space.damping = 0.999  # to prevent it from blowing up.
+    space.sleep_time_threshold = SLEEP_TIME
+    space.idle_speed_threshold = IDLE_SPEED
+    return space
+
+
+def addWalls(space, width, height):
+    floor = pm.Segment(space.static_body, (0, 0), (width, 0), 0.5)
+    floor.friction = 0.5
+
+    leftWall = pm.Segment(space.static_body, (0, 0), (0, height), 0.5)
+    leftWall.friction = 0.5
+
+    roof = pm.Segment(space.static_body, (0, height), (width, height), 0.5)
+    roof.friction = 0.5
+
+    rightWall = pm.Segment(space.static_body, (width, 0), (width, height), 0.5)
+    rightWall.friction = 0.5
+
+    space.add(floor, leftWall, roof, rightWall)
+    return floor, leftWall, roof, rightWall
+
+
+def limbHealth(fighter):
+    return {name: getattr(fighter, name).shape.health for name in HEALTH_LIMBS}
+
+
+class Arena():
+    """A space with four walls and two fighters.
+
+    When screen is None nothing is loaded or drawn and the arena is sized by size instead.
+    """
+    def __init__(self, screen=None, size=ARENA_SIZE, log=None):
+        self.screen = screen
+        self.width, self.height = size if screen is None else screen.get_size()
+        self.space = createSpace()
+        self.collisions = Collision.systemFor(self.space)
+        if screen is None:
+            # Headless arenas stay silent, even in a process that has a mixer running
+            self.collisions.soundPath = None
+        self.playerOne = Character.PlayerOne(self.space, screen, (self.width, self.height))
+        self.playerTwo = Character.PlayerTwo(self.space, screen, (self.width, self.height))
+        self.walls = addWalls(self.space, self.width, self.height)
+        self.fighters = (self.playerOne, self.playerTwo)
+        self.stepper = Stepper.Stepper(self.space, 1.0 / float(FPS), MIN_SUBSTEPS, ITERATIONS, fighters=self.fighters)
+        self.debris = Debris.DebrisPool(self.space, screen, self.stepper)
+        for fighter in self.fighters:
+            fighter.debris = self.debris
+        self.recorder = None
+        self.replay = None
+        self.log = log
+        self.state = None
+        if log is not None:
+            self.collisions.attachLog(log, self.stepper)
+
+    @property
+    def frame(self):
+        return self.stepper.frame
+
+    def reset(self):
+        """Start a new match in the same space, much cheaper than building a new Arena.
+
+        Fighters go back to their spawn pose with full health and lost limbs reattached, and
+        the frame count starts over. The recorder and replay are left for the caller to replace.
+
+        Chipmunk keeps counting shape ids inside a space, so a match after a reset is not
+        bit-for-bit the same as one in a new arena. Recorded matches need a new Arena to replay.
+        """
+        self.collisions.reset()
+        self.debris.clear()
+        # Empty the space and add everything back in the order the arena was built
+        self.space.remove(*self.walls)
+        for fighter in self.fighters:
+            fighter.detach()
+        for fighter in self.fighters:
+            fighter.reset()
+        self.space.add(*self.walls)
+        self.stepper.reset()
+        if self.state is not None:
+            self.state.refresh()
+
+    def snapshot(self):
+        """Capture the state between frames, see Snapshot.take."""
+        return Snapshot.take(self)
+
+    def restore(self, snapshot):
+        """Go back to a state captured by snapshot(), see Snapshot.restore."""
+        Snapshot.restore(self, snapshot)
+        if self.state is not None:
+            self.state.refresh()
+
+    def stateTable(self, out=None):
+        """The arena's StateTable, created on first use and refreshed after every frame from then on.
+
+        out is only used on the first call, see StateTable.StateTable.
+        """
+        if self.state is None:
+            # Imported here so the game itself runs without NumPy
+            import StateTable
+            self.state = StateTable.StateTable(self, out)
+        return self.state
+
+    def act(self, player, action):
+        """Make fighter 1 or 2 do one of Character.ACTIONS before the next frame.
+
+        Going through here instead of calling the fighter directly lets the recorder see it.
+        """
+        if self.recorder is not None:
+            self.recorder.record(self.frame, player, action)
+        getattr(self.fighters[player - 1], action)()
+        self.stepper.disturb()
+
+    def step(self):
+        """Advance the physics by one frame and return the substeps it took.
+
+        Limbs that broke during the frame come off right after it, so a match only depends on its inputs.
+        """
+        if self.replay is not None:
+            self.replay.apply(self)
+        substeps = self.stepper.stepFrame()
+        self.collisions.flush()
+        self.debris.update(self.frame)
+        if self.state is not None:
+            self.state.refresh()
+        return substeps
+
+    def advance(self, elapsed):
+        """Run the frames due after elapsed seconds of real time and return the substeps of each.
+
+        A replay stops at the frame its recording stopped at.
+        """
+        substeps = []
+        for x in range(self.stepper.framesDue(elapsed)):
+            if self.replay is not None and self.replay.ended(self):
+                break
+            substeps.append(self.step())
+        return substeps
+
+    def checkForDeath(self):
+        """Check every limb again, only needed after changing health outside of a collision."""
+        self.playerOne.checkForDeath()
+        self.playerTwo.checkForDeath()
+
+    def winner(self):
+        """1 or 2 once a single fighter has been defeated, otherwise 0."""
+        if self.playerTwo.defeated and not self.playerOne.defeated:
+            return 1
+        if self.playerOne.defeated and not self.playerTwo.defeated:
+            return 2
+        return 0
+
+    def isOver(self):
+        return self.playerOne.defeated or self.playerTwo.defeated
@@ -0,0 +1,163 @@
+# File: Assets.py
+# Loads each image, sound and font once and hands out shared references
+
+from collections import OrderedDict
+import time
+import pygame
+
+BODY_IMAGES = {1: "../assets/img/bodyBox1.png", 2: "../assets/img/bodyBox2.png"}
+FIST_IMAGE = "../assets/img/MaceBall.png"
+JOINT_IMAGE = "../assets/img/joint.png"
+SMACK_SOUND = "../assets/sound/smack.wav"
+MUSIC = "../assets/sound/ThisIsWhoWeAre.mp3"
+# Font of the F3 overlay
+MONOSPACE = "monospace"
+
+# (path, colorkey) for every image the game uses, None meaning the top left pixel
+IMAGES = (
+    (BODY_IMAGES[1], (0, 0, 0)),
+    (BODY_IMAGES[2], (0, 0, 0)),
+    (FIST_IMAGE, None),
+    (JOINT_IMAGE, None)
+)
+SOUNDS = (SMACK_SOUND,)
+# System fonts the game draws with, looked up at startup since the first lookup scans every installed font
+FONTS = (MONOSPACE,)
+
+# Rendered strings kept around for Text sprites and HUD elements
+MAX_TEXTS = 256
+
+images = {}
+sounds = {}
+fonts = {}
+fontPaths = {}
+texts = OrderedDict()
+
+
+def image(path, colorkey=None):
+    """The image at path converted to the display format, loaded on first use.
+
+    Needs a display mode to be set. The surface is shared, so callers must not draw on it.
+    """
+    surface = images.get(path)
+    if surface is None:
+        surface = pygame.image.load(path).convert()
+        surface.set_colorkey(surface.get_at((0, 0)) if colorkey is None else colorkey)
+        images[path] = surface
+    return surface
+
+
+def sound(path):
+    """The sound at path, loaded on first use, or None when the mixer isn't running."""
+    effect = sounds.get(path)
+    if effect is None:
+        if not pygame.mixer.get_init():
+            return None
+        effect = pygame.mixer.Sound(path)
+        sounds[path] = effect
+    return effect
+
+
+def loadedSound(path):
+    """The sound at path if it has been loaded already, otherwise None. Never loads anything."""
+    return sounds.get(path)
+
+
+def fontPath(name):
+    """File of the system font name, None for pygame's own font or a font that isn't installed.
+
+    Answers are kept for the rest of the process. An empty name is pygame's own font and needs no lookup.
+    """
+    if not name:
+        return None
+    if name not in fontPaths:
+        fontPaths[name] = pygame.font.match_font(name)
+    return fontPaths[name]
+
+
+def font(name, size):
+    """The system font name at size, shared by everyone asking for the same name and size.
+
+    Unknown names fall back to pygame's own font, like pygame.font.SysFont.
+    """
+    key = (name, size)
+    systemFont = fonts.get(key)
+    if systemFont is None:
+        systemFont = pygame.font.Font(fontPath(name), size)
+        fonts[key] = systemFont
+    return systemFont
+
+
+def text(string, color, size, name=""):
+    """string rendered antialiased in color, shared and only rendered again after it was evicted."""
+    key = (string, tuple(color), size, name)
+    surface = texts.get(key)
+    if surface is None:
+        surface = font(name, size).render(string, True, color)
+        texts[key] = surface
+        if len(texts) > MAX_TEXTS:
+            texts.popitem(last=False)
+    else:
+        texts.move_to_end(key)
+    return surface
+
+
+def preloadImages():
+    for path, colorkey in IMAGES:
+        image(path, colorkey)
+
+
+def preloadFonts():
+    """Find the files of FONTS now, so the first text drawn in a match doesn't scan the system fonts."""
+    for name in FONTS:
+        fontPath(name)
+
+
+def preload():
+    """Load every known image and sound so the first match doesn't pay for it."""
+    preloadImages()
+    for path in SOUNDS:
+        sound(path)
+
+
+def loadAudio(music=MUSIC):
+    """Start the mixer, load every sound and loop music; returns the seconds it took.
+
+    Meant to run on a thread of its own while the game starts, since opening the audio device and
+    decoding take a while. Until a sound is loaded loadedSound() returns None and it isn't played.
+    Without a working audio device or music file the game just stays silent.
+    """
+    started = time.perf_counter()
+    try:
+        if not pygame.mixer.get_init():
+            pygame.mixer.init()
+        for path in SOUNDS:
+            sound(path)
+        if music is not None:
+            pygame.mixer.music.load(music)
+            pygame.mixer.music.play(-1)
+    except (pygame.error, OSError) as error:
+        print("Audio unavailable: %s" % error)
+    return time.perf_counter() - started
+
+
+def memoryUsage():
+    """Approximate bytes of pixel and sample data held for each loaded asset."""
+    usage = {}
+    for path, surface in images.items():
+        usage[path] = surface.get_width() * surface.get_height() * surface.get_bytesize()
+
+    mixer = pygame.mixer.get_init()
+    if mixer:
+        frequency, size, channels = mixer
+        for path, effect in sounds.items():
+            usage[path] = int(effect.get_length() * frequency) * channels * (abs(size) // 8)
+    return usage
+
+
+def clear():
+    fontPaths.clear()
+    images.clear()
+    sounds.clear()
+    fonts.clear()
+    texts.clear()
@@ -0,0 +1,217 @@
+# File: Benchmark.py
+# Repeatable timings of physics, drawing and whole matches, compared against a saved baseline
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+# Run without a real window or sound card, so this works on any Linux box
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+import pymunk as pm
+import Arena
+import Character
+import Collision
+import Headless
+import RotationCache
+import Stepper
+
+# Seconds each benchmark runs for, per repeat
+DURATION = 1.0
+REPEATS = 3
+# A benchmark is a regression when it is this much slower than the baseline
+TOLERANCE = 0.10
+# Fighter pairs in the crowded physics benchmark
+CROWD = 8
+
+
+def timeLoop(function, duration):
+    """Call function() for about duration seconds and return (calls, seconds)."""
+    calls = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < duration:
+        function()
+        calls += 1
+        elapsed = time.perf_counter() - start
+    return calls, elapsed
+
+
+def benchStep(duration):
+    """Frames per second of one arena with two fighters, stepped like the game does."""
+    arena = Arena.Arena()
+    return timeLoop(arena.step, duration)
+
+
+def benchCrowd(duration, pairs=CROWD):
+    """Frames per second of one space holding pairs fighters on each side."""
+    space = Arena.createSpace()
+    Collision.systemFor(space)
+    size = Arena.ARENA_SIZE
+    fighters = []
+    for x in range(pairs):
+        fighters.append(Character.PlayerOne(space, None, size))
+        fighters.append(Character.PlayerTwo(space, None, size))
+    Arena.addWalls(space, *size)
+    stepper = Stepper.Stepper(space, 1.0 / Arena.FPS, Arena.MIN_SUBSTEPS, Arena.ITERATIONS, fighters=fighters)
+    return timeLoop(stepper.stepFrame, duration)
+
+
+def spriteScreen():
+    if not pygame.display.get_init():
+        pygame.display.init()
+    return pygame.display.set_mode(Arena.ARENA_SIZE)
+
+
+def benchSprite(duration):
+    """Draws per second of a fist that doesn't turn, so its rotated image is always cached."""
+    screen = spriteScreen()
+    sprite = Character.OffensiveBlock(pm.Space(), screen, add=False)
+    sprite.shape.body.position = (400, 400)
+    return timeLoop(sprite.update, duration)
+
+
+def benchSpriteRotating(duration):
+    """Draws per second of a fist turning every draw, rotated again each time as if the cache always missed."""
+    screen = spriteScreen()
+    sprite = Character.OffensiveBlock(pm.Space(), screen, add=False)
+    body = sprite.shape.body
+    body.position = (400, 400)
+
+    def draw():
+        body.angle += 0.01
+        # Otherwise every quantized angle is cached after the first turn and only lookups are timed
+        RotationCache.rotationCache.clear()
+        sprite.update()
+
+    return timeLoop(draw, duration)
+
+
+def benchText(duration):
+    """Draws per second of the victory text."""
+    import BlockFight
+    screen = spriteScreen()
+    if not pygame.font.get_init():
+        pygame.font.init()
+    text = BlockFight.Text(screen, "Player 1 Wins!", (0, 0, 0), 500, 100, 100)
+    text.setPosition(300, 400)
+    return timeLoop(text.update, duration)
+
+
+class FakeArbiter():
+    """Just enough of a pymunk Arbiter for the collision callback."""
+    def __init__(self, shapes, impulse):
+        self.is_first_contact = True
+        self.shapes = shapes
+        self.total_impulse = impulse
+
+
+def benchCollision(duration):
+    """Collision callbacks per second, for a hit too light to do damage."""
+    space = Arena.createSpace()
+    collisions = Collision.systemFor(space)
+    fighter = Character.PlayerOne(space, None, Arena.ARENA_SIZE)
+    arbiter = FakeArbiter((fighter.rElbow.shape, fighter.rFist.shape), (10.0, 10.0))
+
+    def collide():
+        collisions.collisionAction(arbiter, space, None)
+
+    return timeLoop(collide, duration)
+
+
+def benchMatch(duration, frames=1000):
+    """Whole headless matches per second, with both fighters acting at random."""
+    seeds = iter(range(1000000))
+
+    def match():
+        seed = next(seeds)
+        Headless.runMatch(Headless.randomPolicy(2 * seed), Headless.randomPolicy(2 * seed + 1), frames)
+
+    return timeLoop(match, duration)
+
+
+# name: (function, unit of the rate)
+BENCHMARKS = {
+    "step": (benchStep, "frames/s"),
+    "crowd": (benchCrowd, "frames/s"),
+    "sprite": (benchSprite, "draws/s"),
+    "spriteRotating": (benchSpriteRotating, "draws/s"),
+    "text": (benchText, "draws/s"),
+    "collision": (benchCollision, "callbacks/s"),
+    "match": (benchMatch, "matches/s")
+}
+
+
+def run(names=None, duration=DURATION, repeats=REPEATS):
+    """Run the benchmarks and return their results, keeping the best of repeats runs of each."""
+    results = {}
+    for name in names or BENCHMARKS:
+        function, unit = BENCHMARKS[name]
+        rates = []
+        for x in range(repeats):
+            calls, seconds = function(duration)
+            rates.append(calls / seconds)
+        results[name] = {"rate": max(rates), "unit": unit, "runs": rates}
+    return {
+        "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                    "processor": platform.processor(), "pygame": pygame.version.ver, "pymunk": pm.version},
+        "duration": duration,
+        "results": results
+    }
+
+
+def compare(report, baseline):
+    """[(name, rate, baseline rate, change)] for every benchmark in both, change being the relative difference."""
+    rows = []
+    for name, result in sorted(report["results"].items()):
+        old = baseline["results"].get(name)
+        if old is None:
+            continue
+        change = result["rate"] / old["rate"] - 1.0
+        rows.append((name, result["rate"], old["rate"], change))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Block Fight and compare against a baseline")
+    parser.add_argument("names", nargs="*", help="benchmarks to run, all of them by default: " + ", ".join(BENCHMARKS))
+    parser.add_argument("--duration", type=float, default=DURATION, help="seconds per run of each benchmark")
+    parser.add_argument("--repeats", type=int, default=REPEATS)
+    parser.add_argument("--out", default="benchmark.json", help="where to write the results")
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="fraction slower than the baseline that counts as a regression")
+    args = parser.parse_args()
+
+    for name in args.names:
+        if name not in BENCHMARKS:
+            parser.error("unknown benchmark: " + name)
+
+    report = run(args.names, args.duration, args.repeats)
+    with open(args.out, "w") as reportFile:
+        json.dump(report, reportFile, indent=2)
+
+    regressions = 0
+    if args.baseline:
+        with open(args.baseline) as baselineFile:
+            baseline = json.load(baselineFile)
+        for name, rate, oldRate, change in compare(report, baseline):
+            flag = ""
+            if change < -args.tolerance:
+                flag = "  REGRESSION"
+                regressions += 1
+            print("%-16s %12.1f %12.1f %+7.1f%%%s" % (name, rate, oldRate, change * 100, flag))
+    else:
+        for name, result in report["results"].items():
+            print("%-16s %12.1f %s" % (name, result["rate"], result["unit"]))
+
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
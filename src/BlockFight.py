@@ -2,13 +2,24 @@
 # File: BlockFight.py
 # Date: 11/27/2018
 
-import sys
+import time
+# Taken before anything else is imported, for the startup report
+STARTED = time.perf_counter()
+
+import argparse
+import os
+import threading
 import pygame
 from pygame.locals import *
 from pygame.color import *
-import pymunk as pm
-from pymunk import Vec2d
+import Arena
+import Assets
+import Bots
 import Character
+import Controls
+import Profiler
+import Renderer
+# Clip, Netplay and Replay are only imported by the modes that use them, to start faster
 
 __docformat__ = "reStructuredText"
 description = """
@@ -18,7 +29,7 @@ A Cool Game
 
 is_interactive = False
 display_flags = 0
-display_size = (800, 800)
+display_size = Arena.ARENA_SIZE
 ENDGAME_EVENT = pygame.USEREVENT + 3
 
 # Movable Text Sprite
@@ -26,83 +37,85 @@ class Text(pygame.sprite.Sprite):
     def __init__(self, scene, text, textColor, width, height, fontSize=30):
         pygame.sprite.Sprite.__init__(self)
         self.scene = scene
-        self.font = pygame.font.SysFont("", fontSize)
+        self.fontSize = fontSize
         self.text = text
         self.textColor = textColor
         self.size = (width, height)
         self.x = 0
         self.y = 0
+        # Only render again when the text, color or size changes
+        self.dirty = True
+        self.rect = None
 
     def setText(self, text):
-        self.text = text
+        if text != self.text:
+            self.text = text
+            self.dirty = True
+
+    def setColor(self, textColor):
+        if textColor != self.textColor:
+            self.textColor = textColor
+            self.dirty = True
 
     def setPosition(self, x, y):
         self.x = x
         self.y = y
+        if not self.dirty:
+            self.rect.center = (self.x, self.y)
 
     def setDimensions(self, width, height):
-        self.size = (width, height)
+        if (width, height) != self.size:
+            self.size = (width, height)
+            self.dirty = True
 
-    def update(self):
+    def render(self):
+        self.fontSurface = Assets.text(self.text, self.textColor, self.fontSize)
         self.image = pygame.Surface(self.size)
         self.image.set_colorkey(self.image.get_at((0, 0)))
-        fontSurface = self.font.render(self.text, True, self.textColor)
-        xPos = (self.image.get_width() - fontSurface.get_width()) / 2
-        self.image.blit(fontSurface, (xPos, 0))
+        xPos = (self.image.get_width() - self.fontSurface.get_width()) / 2
+        self.image.blit(self.fontSurface, (xPos, 0))
         self.rect = self.image.get_rect()
         self.rect.center = (self.x, self.y)
-        self.scene.blit(fontSurface, (self.x, self.y))
-
-def main():
-    pygame.init()
-    screen = pygame.display.set_mode(display_size, display_flags)
-    pygame.display.set_caption("Mace Ragdoll Fight")
+        self.dirty = False
 
+    def update(self):
+        """Draw the text and return the rect it covered, or None when it is off screen."""
+        if self.dirty:
+            self.render()
+
+        # Text parked off screen isn't drawn at all
+        x, y = self.x, self.y
+        width, height = self.fontSurface.get_size()
+        if x + width > 0 and y + height > 0 and x < self.scene.get_width() and y < self.scene.get_height():
+            return self.scene.blit(self.fontSurface, (x, y))
+        return None
+
+def playMatch(screen, clock, renderer, profiler, arena, keymap, playerOneVictoryText, playerTwoVictoryText,
+              session=None, bot=None, writer=None, startup=None):
+    """Run one match until it ends; returns False when the player closed the game.
+
+    With a Netplay.RollbackSession the keys drive the local fighter and the session steps the arena.
+    bot is (player, Bots.BotWorker) for a computer controlled fighter.
+    Every frame drawn is handed to writer, a Clip.FrameWriter, when there is one.
+    startup, a Profiler.StartupTimer, is reported once the first frame is on screen.
+    F3 shows how long each phase of the loop takes, measured by profiler.
+    """
     width, height = screen.get_size()
-
-    def to_pygame(p):
-        """Small hack to convert pymunk to pygame coordinates"""
-        return int(p.x), int(-p.y + height)
-
-    def from_pygame(p):
-        return to_pygame(p)
-
-    clock = pygame.time.Clock()
+    playerOne = arena.playerOne
+    playerTwo = arena.playerTwo
+    act = arena.act if session is None else session.act
+    advance = arena.advance if session is None else session.advance
+    # A replay is only watched: keys would add actions to it and change how it plays out
+    controls = None if arena.replay is not None else Controls.Controls(keymap, act)
+    profiler.watch(arena)
     keepGoing = True
-
-    # Physics stuff
-    space = pm.Space()
-    space.gravity = (0.0, -1900.0)
-    space.damping = 0.999  # to prevent it from blowing up.
-
-    # Add objects to space
-    playerOne = Character.PlayerOne(space, screen)
-    playerTwo = Character.PlayerTwo(space, screen)
-    playerOneVictoryText = Text(screen, "Player 1 Wins!", (0, 0, 0), 500, 100, 100)
-    playerOneVictoryText.setPosition(-1000, -1000)
-    playerTwoVictoryText = Text(screen, "Player 2 Wins!", (0, 0, 0), 500, 100, 100)
-    playerTwoVictoryText.setPosition(-1000, -1000)
-
-    floor = pm.Segment(space.static_body, (0, 0), (width, 0), 0.5)
-    floor.friction = 0.5
-
-    leftWall = pm.Segment(space.static_body, (0, 0), (0, height), 0.5)
-    leftWall.friction = 0.5
-
-    roof = pm.Segment(space.static_body, (0, height), (width, height), 0.5)
-    roof.friction = 0.5
-
-    rightWall = pm.Segment(space.static_body, (width, 0), (width, height), 0.5)
-    rightWall.friction = 0.5
-
-    space.add(floor, leftWall, roof, rightWall)
-
-    # Play Game music
-    pygame.mixer.music.load('../assets/sound/ThisIsWhoWeAre.mp3')
-    pygame.mixer.music.play(-1)
     continuePlaying = True
 
     while keepGoing:
+        profiler.startFrame()
+        if session is not None and session.disconnected:
+            keepGoing = False
+            continuePlaying = False
 
         for event in pygame.event.get():
             if event.type == QUIT:
@@ -111,6 +124,8 @@ def main():
             elif event.type == KEYDOWN and event.key == K_ESCAPE:
                 keepGoing = False
                 continuePlaying = False
+            elif event.type == KEYDOWN and event.key == K_F3:
+                profiler.toggleOverlay()
             elif event.type == Character.PLAYERONE_VICTOR:
                 playerOneVictoryText.setPosition(width/3, height/2)
                 pygame.time.set_timer(ENDGAME_EVENT, 2500)
@@ -120,71 +135,204 @@ def main():
             elif event.type == ENDGAME_EVENT:
                 pygame.time.set_timer(ENDGAME_EVENT, 0)
                 keepGoing = False
+            elif controls is not None:
+                controls.handle(event)
+
+        if controls is not None:
+            controls.update(arena.frame)
+        if bot is not None:
+            botPlayer, worker = bot
+            action = worker.take()
+            if action is not None:
+                act(botPlayer, action)
+            worker.submit(arena.snapshot())
+            profiler.counters["bot decisions/s"] = worker.decisionsPerSecond()
+        profiler.mark("events")
+
+        # Clear what was drawn last frame
+        renderer.clear()
+
+        renderer.addAll(playerOne.update())
+        renderer.addAll(playerTwo.update())
+        renderer.addAll(arena.debris.draw())
+        renderer.add(playerOneVictoryText.update())
+        renderer.add(playerTwoVictoryText.update())
+        profiler.mark("sprites")
+
+        renderer.addAll(playerOne.drawJoints(THECOLORS["lightgray"]))
+        renderer.addAll(playerTwo.drawJoints(THECOLORS["lightgray"]))
+        profiler.mark("joints")
+
+        # The whole screen is up to date here, even where the renderer won't push it
+        if writer is not None:
+            writer.submit(screen)
+        profiler.mark("capture")
+
+        renderer.addAll(profiler.drawOverlay(screen))
+        profiler.mark("overlay")
+
+        # Update physics with the real time the last frame took
+        advance(clock.get_time() / 1000.0)
+        profiler.mark("physics")
+
+        renderer.present()
+        profiler.mark("present")
+        if arena.replay is not None and arena.replay.ended(arena):
+            keepGoing = False
+        if startup is not None:
+            startup.stage("first frame")
+            print(startup.report())
+            startup = None
+        clock.tick(Arena.FPS)
+        profiler.mark("wait")
+        profiler.endFrame()
 
-            # Player one controls
-            elif event.type == KEYDOWN and event.key == K_f:
-                playerOne.kickRFoot()
-            elif event.type == KEYDOWN and event.key == K_d:
-                playerOne.reverseKickRFoot()
-            elif event.type == KEYDOWN and event.key == K_r:
-                playerOne.kickLFoot()
-            elif event.type == KEYDOWN and event.key == K_e:
-                playerOne.reverseKickLFoot()
-            elif event.type == KEYDOWN and event.key == K_v:
-                playerOne.punchRight()
-            elif event.type == KEYDOWN and event.key == K_c:
-                playerOne.reversePunchRight()
-            elif event.type == KEYDOWN and event.key == K_x:
-                playerOne.punchLeft()
-            elif event.type == KEYDOWN and event.key == K_z:
-                playerOne.reversePunchLeft()
-
-            # Player two controls
-            elif event.type == KEYDOWN and event.key == K_j:
-                playerTwo.kickRFoot()
-            elif event.type == KEYDOWN and event.key == K_k:
-                playerTwo.reverseKickRFoot()
-            elif event.type == KEYDOWN and event.key == K_u:
-                playerTwo.kickLFoot()
-            elif event.type == KEYDOWN and event.key == K_i:
-                playerTwo.reverseKickLFoot()
-            elif event.type == KEYDOWN and event.key == K_n:
-                playerTwo.punchRight()
-            elif event.type == KEYDOWN and event.key == K_m:
-                playerTwo.reversePunchRight()
-            elif event.type == KEYDOWN and event.key == K_COMMA:
-                playerTwo.punchLeft()
-            elif event.type == KEYDOWN and event.key == K_PERIOD:
-                playerTwo.reversePunchLeft()
-
-        # Clear screen
-        screen.fill(THECOLORS["white"])
-
-        playerOne.update()
-        playerTwo.update()
-        playerOneVictoryText.update()
-        playerTwoVictoryText.update()
-
-        for constraint in space.constraints:
-            if (isinstance(constraint, pm.PinJoint)):
-                pv1 = constraint.a.position + constraint.anchor_a
-                pv2 = constraint.b.position + constraint.anchor_b
-                p1 = to_pygame(pv1)
-                p2 = to_pygame(pv2)
-                pygame.draw.aalines(screen, THECOLORS["lightgray"], False, [p1, p2])
-
-        # Update physics
-        fps = 50
-        iterations = 25
-        dt = 1.0 / float(fps) / float(iterations)
-        for x in range(iterations):  # 10 iterations to get a more stable simulation
-            space.step(dt)
-
-        pygame.display.flip()
-        clock.tick(fps)
     return continuePlaying
 
 
+def loadAudio(startup):
+    """Start the mixer, sounds and music, then add the time it took to startup's report."""
+    startup.background("audio", Assets.loadAudio())
+
+
+def main(recordPath=None, replayPath=None, netplay=None, profilePath=None, botName=None, botPlayer=2,
+         clipPath=None, started=None):
+    """Play matches until the window is closed, reusing the window, music and arena for every rematch.
+
+    With recordPath the inputs of each match are saved to <recordPath>-<match><ext>. A replay
+    from replayPath opens the window at the size it was recorded at, ignores the keys and closes
+    it where the recording stopped. netplay is (player, local port, (peer host, peer port)) to
+    play one fighter against another machine.
+    With profilePath the frame timings are written there on exit, see Profiler.export.
+    botName picks one of Bots.BOTS to play botPlayer's fighter.
+    With clipPath every frame shown is also written there, see Clip.FrameWriter; when the disk
+    can't keep up the oldest waiting frames are dropped rather than slowing the game.
+    started is when the process started, as a time.perf_counter() value, for the startup report.
+    """
+    startup = Profiler.StartupTimer(started, pending=("audio",))
+    startup.stage("imports")
+    # Only what the game uses: pygame.init() would also start the mixer, joysticks and more
+    pygame.display.init()
+    pygame.font.init()
+    startup.stage("pygame modules")
+    size = display_size
+    replayInputs = None
+    if recordPath is not None or replayPath is not None:
+        import Replay
+    if replayPath is not None:
+        # The replay only plays out the same in an arena of the size it was recorded in
+        size, replayInputs, replayEnd = Replay.load(replayPath)
+    screen = pygame.display.set_mode(size, display_flags)
+    if replayInputs is not None and screen.get_size() != tuple(size):
+        raise ValueError("%s was recorded in a %dx%d arena but the window is %dx%d"
+                         % ((replayPath,) + tuple(size) + screen.get_size()))
+    pygame.display.set_caption("Mace Ragdoll Fight")
+    startup.stage("window")
+    # The mixer starts with the music on a thread of its own once the window is up, and hits
+    # are silent until it's ready
+    threading.Thread(target=loadAudio, args=(startup,), name="audio", daemon=True).start()
+    Assets.preloadImages()
+    startup.stage("images")
+    Assets.preloadFonts()
+    startup.stage("fonts")
+    keymap = Controls.load()
+    startup.stage("controls")
+
+    width, height = screen.get_size()
+
+    clock = pygame.time.Clock()
+    renderer = Renderer.Renderer(screen, THECOLORS["white"])
+    profiler = Profiler.Profiler()
+    writer = None
+    if clipPath is not None:
+        import Clip
+        writer = Clip.FrameWriter(clipPath, (width, height), queueSize=Clip.GAME_QUEUE_SIZE, drop=Clip.DROP_OLDEST)
+
+    # Physics stuff
+    arena = Arena.Arena(screen)
+
+    link = None
+    if netplay is not None:
+        import Netplay
+        netPlayer, port, peer = netplay
+        link = Netplay.UdpLink(port, peer)
+
+    playerOneVictoryText = Text(screen, "Player 1 Wins!", (0, 0, 0), 500, 100, 100)
+    playerTwoVictoryText = Text(screen, "Player 2 Wins!", (0, 0, 0), 500, 100, 100)
+    startup.stage("arena")
+
+    match = 0
+    while True:
+        if recordPath is not None:
+            arena.recorder = Replay.InputRecorder((width, height))
+        if replayInputs is not None:
+            arena.replay = Replay.ReplayPlayer(replayInputs, replayEnd)
+        playerOneVictoryText.setPosition(-1000, -1000)
+        playerTwoVictoryText.setPosition(-1000, -1000)
+        session = None
+        if link is not None:
+            session = Netplay.RollbackSession(arena, netPlayer, link, match % 256)
+        bot = None
+        if botName is not None:
+            bot = (botPlayer, Bots.BotWorker(Bots.BOTS[botName](botPlayer)))
+        renderer.invalidate()
+        clock.tick()
+
+        continuePlaying = playMatch(screen, clock, renderer, profiler, arena, keymap, playerOneVictoryText,
+                                    playerTwoVictoryText, session, bot, writer, startup)
+        startup = None
+        if bot is not None:
+            bot[1].stop()
+            print("Bot decisions per second: %.1f" % bot[1].averageRate())
+
+        if recordPath is not None:
+            base, ext = os.path.splitext(recordPath)
+            arena.recorder.save("%s-%d%s" % (base, match, ext), arena.frame)
+        # A replay is watched once
+        if not continuePlaying or replayInputs is not None:
+            break
+        # Rematch in the same space: put the fighters back instead of building everything again.
+        # Recorded and replayed matches get a new arena so they play out exactly like Replay.py,
+        # and so do network matches so both machines start from the same state.
+        if recordPath is not None or replayInputs is not None or link is not None:
+            arena = Arena.Arena(screen)
+        else:
+            arena.reset()
+        match += 1
+
+    if link is not None:
+        link.close()
+    if profilePath is not None:
+        profiler.export(profilePath)
+    if writer is not None:
+        writer.close()
+        print("Clip frames written: %d, dropped: %d" % (writer.written, writer.dropped))
+
+
 if __name__ == '__main__':
-    while (main()):
-        pass
+    parser = argparse.ArgumentParser(description="Mace Ragdoll Fight")
+    parser.add_argument("--record", help="save each match's inputs to <record>-<match><ext>")
+    parser.add_argument("--replay", help="watch a recorded match")
+    parser.add_argument("--player", type=int, choices=(1, 2), help="play this fighter over the network")
+    parser.add_argument("--port", type=int, default=47001, help="local UDP port for network play")
+    parser.add_argument("--peer", help="host:port of the other player for network play")
+    parser.add_argument("--profile", help="write frame timings to this .csv or .json file on exit")
+    parser.add_argument("--bot", choices=sorted(Bots.BOTS), help="let the computer play a fighter")
+    parser.add_argument("--bot-player", type=int, choices=(1, 2), default=2, help="fighter the bot plays")
+    parser.add_argument("--clip", help="also write every frame to this image pattern (frame-%%05d.png) or video file")
+    args = parser.parse_args()
+    if args.replay is not None and (args.player is not None or args.bot is not None):
+        parser.error("--replay plays the recorded inputs only; it can't be combined with --player or --bot")
+    netplay = None
+    if args.player is not None:
+        if args.peer is None:
+            parser.error("--player needs --peer")
+        # Rollbacks would record the local inputs again, and a netplay match doesn't replay like Arena.step
+        if args.record is not None:
+            parser.error("--record can't be combined with --player")
+        # Over the network every action presses the local fighter, whichever one the bot plans for
+        if args.bot is not None:
+            parser.error("--bot can't be combined with --player")
+        import Netplay
+        netplay = (args.player, args.port, Netplay.parsePeer(args.peer))
+    main(args.record, args.replay, netplay, args.profile, args.bot, args.bot_player, args.clip, STARTED)
@@ -0,0 +1,227 @@
+# File: Bots.py
+# Computer controlled fighters: a rule based bot, a lookahead bot and a thread to run them on
+
+import collections
+import threading
+import time
+import Arena
+import Character
+import Snapshot
+
+# Striking parts: (part, limb alive flag, action towards the fighter's facing, action away from it)
+STRIKERS = (
+    ("rFist", "rightArmAlive", "punchRight", "reversePunchRight"),
+    ("lFist", "leftArmAlive", "punchLeft", "reversePunchLeft"),
+    ("rFoot", "rightLegAlive", "kickRFoot", "reverseKickRFoot"),
+    ("lFoot", "leftLegAlive", "kickLFoot", "reverseKickLFoot")
+)
+# Parts a hit damages: the joints that break limbs off and the torso
+TARGETS = Arena.HEALTH_LIMBS
+
+# Where things are in a Snapshot: every fighter has its core body and then its parts, in skeleton order
+PART_NAMES = tuple(part[0] for part in Character.SKELETON["parts"])
+LIMB_FLAGS = tuple(limb[0] for limb in Character.SKELETON["limbs"])
+BODIES_PER_FIGHTER = 1 + len(PART_NAMES)
+FIELDS = len(Snapshot.BODY_FIELDS)
+
+# Distance in pixels from a striking part to a target within which the rule bot swings
+REACH = 220
+# Frames the rule bot waits between actions
+COOLDOWN = 8
+# Frames the lookahead bot simulates after each candidate action
+HORIZON = 12
+# Seconds a bot may think about one decision when running on a BotWorker
+BUDGET = 0.015
+# Score of a whole limb, against a point of health
+LIMB_VALUE = 10
+WIN_VALUE = 1000
+
+
+def partPosition(snapshot, side, name):
+    """(x, y) of a fighter's part in a snapshot; side is 0 for player one and 1 for player two."""
+    index = (side * BODIES_PER_FIGHTER + 1 + PART_NAMES.index(name)) * FIELDS
+    return snapshot.bodies[index], snapshot.bodies[index + 1]
+
+
+def limbAlive(snapshot, side, flag):
+    return bool(snapshot.limbs[side * len(LIMB_FLAGS) + LIMB_FLAGS.index(flag)])
+
+
+class RuleBot():
+    """Swings the striking part closest to one of the opponent's joints or torso, if it is in reach.
+
+    It decides from a Snapshot only, so it can run on another thread than the arena.
+    """
+    def __init__(self, player, reach=REACH, cooldown=COOLDOWN):
+        self.player = player
+        self.side = player - 1
+        self.facing = Character.SIDES[player][1]
+        self.reach = reach
+        self.cooldown = cooldown
+        self.lastAction = -cooldown
+
+    def choices(self, snapshot):
+        """Every action worth trying, closest strike first."""
+        targets = [partPosition(snapshot, 1 - self.side, name) for name in TARGETS]
+        ranked = []
+        for part, flag, towards, away in STRIKERS:
+            if not limbAlive(snapshot, self.side, flag):
+                continue
+            x, y = partPosition(snapshot, self.side, part)
+            distance, targetX = min(((tx - x) ** 2 + (ty - y) ** 2, tx) for tx, ty in targets)
+            ahead = (targetX - x) * self.facing >= 0
+            ranked.append((distance, towards if ahead else away, away if ahead else towards))
+        ranked.sort()
+        return ranked
+
+    def plan(self, snapshot, deadline=None):
+        if snapshot.frame - self.lastAction < self.cooldown:
+            return None
+        ranked = self.choices(snapshot)
+        if not ranked or ranked[0][0] > self.reach * self.reach:
+            return None
+        self.lastAction = snapshot.frame
+        return ranked[0][1]
+
+    def __call__(self, arena, fighter, frame):
+        """Headless.runMatch policy interface."""
+        return self.plan(arena.snapshot())
+
+
+def score(arena, side):
+    """How well fighter side (0 or 1) is doing against the other one."""
+    me = arena.fighters[side]
+    them = arena.fighters[1 - side]
+    value = 0.0
+    for fighter, sign in ((me, 1), (them, -1)):
+        value += sign * sum(Arena.limbHealth(fighter).values())
+        value += sign * LIMB_VALUE * sum(getattr(fighter, flag) for flag in LIMB_FLAGS)
+    winner = arena.winner()
+    if winner:
+        value += WIN_VALUE if winner == side + 1 else -WIN_VALUE
+    return value
+
+
+class LookaheadBot():
+    """Tries each action on a private copy of the arena and keeps the one that plays out best.
+
+    The copy is restored from a snapshot of the real arena and stepped HORIZON frames with
+    the opponent doing nothing. Candidates are tried in the rule bot's order, so when the
+    deadline cuts the search short the best of the likeliest actions is used.
+    """
+    def __init__(self, player, horizon=HORIZON, size=Arena.ARENA_SIZE, cooldown=COOLDOWN):
+        self.player = player
+        self.side = player - 1
+        self.horizon = horizon
+        self.cooldown = cooldown
+        self.lastAction = -cooldown
+        self.rules = RuleBot(player)
+        self.sim = Arena.Arena(size=size)
+
+    def outcome(self, snapshot, action):
+        sim = self.sim
+        sim.restore(snapshot)
+        if action is not None:
+            sim.act(self.player, action)
+        for x in range(self.horizon):
+            sim.step()
+            if sim.isOver():
+                break
+        return score(sim, self.side)
+
+    def plan(self, snapshot, deadline=None):
+        if snapshot.frame - self.lastAction < self.cooldown:
+            return None
+        candidates = [None]
+        for distance, best, other in self.rules.choices(snapshot):
+            candidates.extend((best, other))
+
+        bestAction = None
+        bestScore = None
+        for action in candidates:
+            if deadline is not None and bestScore is not None and time.perf_counter() > deadline:
+                break
+            value = self.outcome(snapshot, action)
+            if bestScore is None or value > bestScore:
+                bestAction = action
+                bestScore = value
+        if bestAction is not None:
+            self.lastAction = snapshot.frame
+        return bestAction
+
+    def __call__(self, arena, fighter, frame):
+        """Headless.runMatch policy interface."""
+        return self.plan(arena.snapshot())
+
+
+BOTS = {"rule": RuleBot, "lookahead": LookaheadBot}
+
+
+class BotWorker():
+    """Runs a bot's plan() on its own thread so the game loop never waits for it.
+
+    Every frame the game submits a snapshot and takes whatever decision is ready, which
+    was planned on a snapshot a frame or two old. Only the newest snapshot is planned
+    for, within budget seconds. Physics steps run in chipmunk without holding the GIL.
+    """
+    def __init__(self, bot, budget=BUDGET):
+        self.bot = bot
+        self.budget = budget
+        self.condition = threading.Condition()
+        self.latest = None
+        self.decision = None
+        self.running = True
+        self.decisionTimes = collections.deque()
+        self.decisions = 0
+        self.started = time.perf_counter()
+        self.thread = threading.Thread(target=self.run, name="bot", daemon=True)
+        self.thread.start()
+
+    def submit(self, snapshot):
+        with self.condition:
+            self.latest = snapshot
+            self.condition.notify()
+
+    def take(self):
+        """The action decided since the last call, or None."""
+        with self.condition:
+            decision = self.decision
+            self.decision = None
+        return decision
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.running and self.latest is None:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                snapshot = self.latest
+                self.latest = None
+
+            action = self.bot.plan(snapshot, time.perf_counter() + self.budget)
+            now = time.perf_counter()
+            with self.condition:
+                if action is not None:
+                    self.decision = action
+                self.decisionTimes.append(now)
+                self.decisions += 1
+
+    def decisionsPerSecond(self):
+        """Decisions made during the last second."""
+        now = time.perf_counter()
+        with self.condition:
+            times = self.decisionTimes
+            while times and times[0] < now - 1.0:
+                times.popleft()
+            return len(times)
+
+    def averageRate(self):
+        """Decisions per second since the worker started."""
+        return self.decisions / max(1e-9, time.perf_counter() - self.started)
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.thread.join()
@@ -7,14 +7,22 @@ import pygame
 import pymunk as pm
 from pymunk import Vec2d
 import math
-
-COLLISION_BODY = 1
-COLLISION_OFFENSE = 2
-COLLISION_DEFENSE = 3
+import Assets
+import Collision
+from Collision import COLLISION_BODY, COLLISION_OFFENSE, COLLISION_DEFENSE
+from RotationCache import rotationCache
 
 PLAYERONE_VICTOR = pygame.USEREVENT+1
 PLAYERTWO_VICTOR = pygame.USEREVENT+2
 
+# Names of the action methods every fighter supports
+ACTIONS = (
+    "kickRFoot", "reverseKickRFoot",
+    "kickLFoot", "reverseKickLFoot",
+    "punchRight", "reversePunchRight",
+    "punchLeft", "reversePunchLeft"
+)
+
 collisionGroups = {
     "PLAYER1": 0b01,
     "PLAYER2": 0b10
@@ -22,77 +30,63 @@ collisionGroups = {
 
 
 class PymunkSprite():
-    def __init__(self, space, screen, image, shape):
+    def __init__(self, space, screen, image, shape, colorkey=None, add=True):
         self.shape = shape
         self.screen = screen
-        self.imageMaster = pygame.image.load(image).convert()
-        self.imageMaster.set_colorkey(self.imageMaster.get_at((0, 0)))
-        space.add(shape.body, shape)
+        self.image = image
+        self.imageMaster = None
+        # Headless fighters have no screen, so there is nothing to load or draw
+        if screen is not None:
+            self.imageMaster = Assets.image(image, colorkey)
+        if add:
+            space.add(shape.body, shape)
 
     def flipy(self, y):
         """Small hack to convert chipmunk physics to pygame coordinates"""
-        return -y + self.screen.get_width()
+        return -y + self.screen.get_height()
+
+    def update(self, offset=None):
+        """Draw the sprite, shifted by offset if given, and return the screen rect it covered, None when headless."""
+        if self.screen is None:
+            return None
 
-    def update(self):
         # image draw
         p = self.shape.body.position
-        p = Vec2d(p.x, self.flipy(p.y))
+        if offset is not None:
+            p = p + offset
 
         # we need to rotate 180 degrees because of the y coordinate flip
         angle_degrees = math.degrees(self.shape.body.angle) + 180
-        rotated_logo_img = pygame.transform.rotate(self.imageMaster, angle_degrees)
-
-        offset = Vec2d(rotated_logo_img.get_size()) / 2.
-        p = p - offset
+        rotated_logo_img, halfWidth, halfHeight = rotationCache.get(self.image, self.imageMaster, angle_degrees)
 
-        self.screen.blit(rotated_logo_img, p)
+        return self.screen.blit(rotated_logo_img, (p.x - halfWidth, self.flipy(p.y) - halfHeight))
 
 class BodyShape(pm.Poly):
     def __init__(self, space, body, points):
         pm.Poly.__init__(self, body, points)
         self.health = 500
+        self.maxHealth = self.health
         self.collision_type = COLLISION_BODY
-        self.soundEffect = pygame.mixer.Sound('../assets/sound/smack.wav')
-        # We get a collision handler representation.
-        handler = space.add_collision_handler(COLLISION_BODY, COLLISION_OFFENSE)
-
-        # Then we set the collision handler's methods to what we want.
-        handler.post_solve = self.collisionAction
-
-    def collisionAction(self, arbiter, space, data):
-        if (arbiter.is_first_contact):
-            force = math.sqrt(math.pow(arbiter.total_impulse[0], 2) + math.pow(arbiter.total_impulse[1], 2))
-            print("Total force: ", force)
-            if force > 1500:
-                self.soundEffect.play()
-                a, b = arbiter.shapes
-                a.health = a.health - 1
-                print("Health value: ", a.health)
-
-        return True
+        Collision.systemFor(space).register(self, Collision.BODY_THRESHOLD)
 
 class Body(PymunkSprite):
-    def __init__(self, space, screen, player):
+    def __init__(self, space, screen, player, add=True):
         vs = [(-25, 50), (25, 50), (25, -50), (-25, -50)]
         mass = 10
         moment = pm.moment_for_poly(mass, vs)
         body = pm.Body(mass, moment)
         shape = BodyShape(space, body, vs)
-        if(player == 1):
-            PymunkSprite.__init__(self, space, screen, "../assets/img/bodyBox1.png", shape)
-        else:
-            PymunkSprite.__init__(self, space, screen, "../assets/img/bodyBox2.png", shape)
-        self.imageMaster.set_colorkey((0, 0, 0))
+        PymunkSprite.__init__(self, space, screen, Assets.BODY_IMAGES[player], shape, (0, 0, 0), add)
 
 
 class OffensiveBlock(PymunkSprite):
-    def __init__(self, space, screen):
+    def __init__(self, space, screen, add=True):
         vs = [(-25, 25), (25, 25), (25, -25), (-25, -25)]
         mass = 10
         moment = pm.moment_for_poly(mass, vs)
         body = pm.Body(mass, moment)
         shape = pm.Poly(body, vs)
-        PymunkSprite.__init__(self, space, screen, "../assets/img/MaceBall.png", shape)
+        PymunkSprite.__init__(self, space, screen, Assets.FIST_IMAGE, shape, add=add)
         self.shape.collision_type = COLLISION_OFFENSE
 
 
@@ -100,463 +94,362 @@ class DefenseShape(pm.Poly):
     def __init__(self, space, body, points):
         pm.Poly.__init__(self, body, points)
         self.health = 15
+        self.maxHealth = self.health
         self.collision_type = COLLISION_DEFENSE
-        self.soundEffect = pygame.mixer.Sound('../assets/sound/smack.wav')
-        # We get a collision handler representation.
-        handler = space.add_collision_handler(COLLISION_DEFENSE, COLLISION_OFFENSE)
-
-        # Then we set the collision handler's methods to what we want.
-        handler.post_solve = self.collisionAction
-
-    def collisionAction(self, arbiter, space, data):
-        if (arbiter.is_first_contact):
-            force = math.sqrt(math.pow(arbiter.total_impulse[0], 2) + math.pow(arbiter.total_impulse[1], 2))
-            print("Total force: ", force)
-            if force > 1000:
-                self.soundEffect.play()
-                a, b = arbiter.shapes
-                a.health = a.health - 1
-                print("Health value: ", a.health)
-
-        return True
+        Collision.systemFor(space).register(self, Collision.DEFENSE_THRESHOLD)
 
 
 class DefensiveBlock(PymunkSprite):
-    def __init__(self, space, screen):
+    def __init__(self, space, screen, add=True):
         vs = [(-20, 20), (20, 20), (20, -20), (-20, -20)]
         mass = 10
         moment = pm.moment_for_poly(mass, vs)
         body = pm.Body(mass, moment)
         shape = DefenseShape(space, body, vs)
-        PymunkSprite.__init__(self, space, screen, "../assets/img/joint.png", shape)
-
-
-class PlayerOne():
-    def __init__(self, space, screen):
-        self.space = space
-        self.screen = screen
-        width, height = screen.get_size()
-        pos = (width / 4, height / 4)
-        shapeFilter = pm.ShapeFilter(collisionGroups["PLAYER1"], collisionGroups["PLAYER2"])
-        self.coreBody = pm.Body(10, 1000)
-        self.coreBody.position = pos
-
-        self.rightArmAlive = True
-        self.leftArmAlive = True
-        self.rightLegAlive = True
-        self.leftLegAlive = True
-
-        self.torso = Body(space, screen, 1)
-        self.torso.shape.filter = shapeFilter
-        self.torsoRotationLimit = pm.RotaryLimitJoint(self.space.static_body, self.torso.shape.body, -math.pi / 10,
-                                                      math.pi / 10)
-        self.torsoLocationTie = pm.PinJoint(self.coreBody, self.torso.shape.body)
-        self.torsoLocationTie.distance = 0
-        self.torso.shape.body.position = pos
-
-        # Set up arms
-        self.rElbow = DefensiveBlock(self.space, self.screen)
-        self.rElbow.shape.body.position = self.torso.shape.body.position + (-50, 35)
-        self.rElbow.shape.filter = shapeFilter
-        self.rUpperArm = pm.PinJoint(self.torso.shape.body, self.rElbow.shape.body, (0, 35), (0, 0))
-        self.rUpperArm.distance = 40
-
-        self.rFist = OffensiveBlock(self.space, self.screen)
-        self.rFist.shape.filter = shapeFilter
-        self.rFist.shape.body.position = self.rElbow.shape.body.position + (-25, 0)
-        self.rFistRotationLimit = pm.RotaryLimitJoint(self.space.static_body, self.rFist.shape.body, -math.pi / 5,
-                                                      math.pi / 5)
-
-
-        self.rLowerArm = pm.PinJoint(self.rElbow.shape.body, self.rFist.shape.body)
-        self.rLowerArm.distance = 50
-
-        self.lElbow = DefensiveBlock(self.space, self.screen)
-        self.lElbow.shape.body.position = self.torso.shape.body.position + (50, 35)
-        self.lElbow.shape.filter = shapeFilter
-        self.lUpperArm = pm.PinJoint(self.torso.shape.body, self.lElbow.shape.body, (0, 35), (0, 0))
-        self.lUpperArm.distance = 40
-
-        self.lFist = OffensiveBlock(self.space, self.screen)
-        self.lFist.shape.filter = shapeFilter
-        self.lFist.shape.body.position = self.lElbow.shape.body.position + (25, 0)
-        self.lFistRotationLimit = pm.RotaryLimitJoint(self.space.static_body, self.lFist.shape.body, -math.pi / 5,
-                                                      math.pi / 5)
-
-        self.lLowerArm = pm.PinJoint(self.lElbow.shape.body, self.lFist.shape.body)
-        self.lLowerArm.distance = 50
-
-        # Set up legs
-        self.rKnee = DefensiveBlock(self.space, self.screen)
-        self.rKnee.shape.body.position = self.torso.shape.body.position + (-25, -100)
-        self.rKnee.shape.filter = shapeFilter
-
-        self.rUpperLeg = pm.PinJoint(self.torso.shape.body, self.rKnee.shape.body, (0, -50), (0, 0))
-        self.rUpperLeg.distance = 40
-
-        self.rFoot = OffensiveBlock(self.space, self.screen)
-        self.rFoot.shape.friction = 1.5
-        self.rFoot.shape.filter = shapeFilter
-        self.rFoot.shape.body.position = self.rKnee.shape.body.position + (-25, -10)
-        self.rFootRotationLimit = pm.RotaryLimitJoint(self.space.static_body, self.rFoot.shape.body, -math.pi / 5,
-                                                      math.pi / 5)
-
-        self.rLowerLeg = pm.PinJoint(self.rKnee.shape.body, self.rFoot.shape.body, (0, 0), (0, 25))
-        self.rLowerLeg.distance = 50
-
-        self.lKnee = DefensiveBlock(self.space, self.screen)
-        self.lKnee.shape.body.position = self.torso.shape.body.position + (25, -100)
-        self.lKnee.shape.filter = shapeFilter
-
-        self.lUpperLeg = pm.PinJoint(self.torso.shape.body, self.lKnee.shape.body, (0, -50), (0, 0))
-        self.lUpperLeg.distance = 40
-
-        self.rLowerLeg = pm.PinJoint(self.rKnee.shape.body, self.rFoot.shape.body, (0, 0), (0, 25))
-        self.rLowerLeg.distance = 50
-
-        self.lKnee = DefensiveBlock(self.space, self.screen)
-        self.lKnee.shape.body.position = self.torso.shape.body.position + (25, -100)
-        self.lKnee.shape.filter = shapeFilter
-
-        self.lUpperLeg = pm.PinJoint(self.torso.shape.body, self.lKnee.shape.body, (0, -50), (0, 0))
-        self.lUpperLeg.distance = 40
-
-        self.lFoot = OffensiveBlock(self.space, self.screen)
-        self.lFoot.shape.friction = 1.5
-        self.lFoot.shape.filter = shapeFilter
-        self.lFoot.shape.body.position = self.lKnee.shape.body.position + (25, -10)
-        self.lFootRotationLimit = pm.RotaryLimitJoint(self.space.static_body, self.lFoot.shape.body, -math.pi / 5,
-                                                      math.pi / 5)
-
-        self.lLowerLeg = pm.PinJoint(self.lKnee.shape.body, self.lFoot.shape.body, (0, 0), (0, 25))
-        self.lLowerLeg.distance = 50
-
-        self.rLegDownwardForce = pm.DampedSpring(self.coreBody, self.rFoot.shape.body, (0, 0), (0, 25), 300, 1250, 1)
-        self.lLegDownwardForce = pm.DampedSpring(self.coreBody, self.lFoot.shape.body, (0, 0), (0, 25), 300, 1250, 1)
-
-        self.space.add(self.coreBody, self.torsoRotationLimit, self.torsoLocationTie,
-                       self.rUpperLeg, self.rLegDownwardForce, self.lUpperLeg, self.lLegDownwardForce,
-                       self.rFootRotationLimit, self.lFootRotationLimit,
-                       self.rFistRotationLimit, self.lFistRotationLimit,
-                       self.lLowerLeg, self.rLowerLeg,
-                       self.rUpperArm, self.rLowerArm,
-                       self.lUpperArm, self.lLowerArm)
-
-    def checkForDeath(self):
-        if self.rightLegAlive:
-            if self.rKnee.shape.health <= 0:
-                self.rightLegAlive = False
-                self.space.remove(
-                    self.rKnee.shape.body,
-                    self.rKnee.shape,
-                    self.rUpperLeg,
-                    self.rLowerLeg,
-                    self.rLegDownwardForce,
-                    self.rFootRotationLimit,
-                    self.rFoot.shape.body,
-                    self.rFoot.shape
-                )
-
-        if self.leftLegAlive:
-            if self.lKnee.shape.health <= 0:
-                self.leftLegAlive = False
-                self.space.remove(
-                    self.lKnee.shape.body,
-                    self.lKnee.shape,
-                    self.lUpperLeg,
-                    self.lLowerLeg,
-                    self.lFootRotationLimit,
-                    self.lLegDownwardForce,
-                    self.lFoot.shape.body,
-                    self.lFoot.shape
-                )
-
-        if self.rightArmAlive:
-            if self.rElbow.shape.health <= 0:
-                self.rightArmAlive = False
-                self.space.remove(
-                    self.rFist.shape.body, self.rFist.shape,
-                    self.rFistRotationLimit,
-                    self.rElbow.shape.body, self.rElbow.shape,
-                    self.rUpperArm,
-                    self.rLowerArm
-                )
-
-        if self.leftArmAlive:
-            if self.lElbow.shape.health <= 0:
-                self.leftArmAlive = False
-                self.space.remove(
-                    self.lFist.shape, self.lFist.shape.body,
-                    self.lFistRotationLimit,
-                    self.lElbow.shape, self.lElbow.shape.body,
-                    self.lUpperArm, self.lLowerArm
-                )
-
-        if (not self.leftLegAlive and not self.rightLegAlive
-                and not self.leftArmAlive and not self.rightArmAlive) or (self.torso.shape.health == 0):
-            pygame.event.post(pygame.event.Event(PLAYERTWO_VICTOR, {}))
-
-    def update(self):
-        self.checkForDeath()
-
-        if self.leftArmAlive:
-            self.lElbow.update()
-            self.lFist.update()
-
-        if self.leftLegAlive:
-            self.lFoot.update()
-            self.lKnee.update()
-
-        if self.torso.shape.health > 0:
-            self.torso.update()
-
-        if self.rightArmAlive:
-            self.rElbow.update()
-            self.rFist.update()
-
-        if self.rightLegAlive:
-            self.rFoot.update()
-            self.rKnee.update()
-
-
-
-    def kickRFoot(self):
-        self.rFoot.shape.body.apply_impulse_at_local_point((Vec2d.zero() + (1, math.sqrt(2) / 2)) * 25000, (0, 0))
-
-    def reverseKickRFoot(self):
-        self.rFoot.shape.body.apply_impulse_at_local_point((Vec2d.zero() + (-1, math.sqrt(2) / 2)) * 25000, (0, 0))
-
-    def kickLFoot(self):
-        self.lFoot.shape.body.apply_impulse_at_local_point((Vec2d.zero() + (1, math.sqrt(2) / 2)) * 25000, (0, 0))
-
-
-    def reverseKickLFoot(self):
-        self.lFoot.shape.body.apply_impulse_at_local_point((Vec2d.zero() + (-1, math.sqrt(2) / 2)) * 25000, (0, 0))
+        PymunkSprite.__init__(self, space, screen, Assets.JOINT_IMAGE, shape, add=add)
+
+
+# Skeleton description shared by every fighter.
+# Parts: (name, block class, part it is placed relative to, offset from that part, friction)
+# Joints: (name, kind, body a, body b, arguments) where "core" is the fighter's core body and
+# "static" the space's static body. Pins take (anchor a, anchor b, distance), rotary limits
+# take (min, max) and springs take (anchor a, anchor b, rest length, stiffness, damping).
+# Limbs: (alive flag, part whose health decides it, parts that fall off with it)
+SKELETON = {
+    "parts": (
+        ("torso", Body, None, (0, 0), None),
+        ("rElbow", DefensiveBlock, "torso", (-50, 35), None),
+        ("rFist", OffensiveBlock, "rElbow", (-25, 0), None),
+        ("lElbow", DefensiveBlock, "torso", (50, 35), None),
+        ("lFist", OffensiveBlock, "lElbow", (25, 0), None),
+        ("rKnee", DefensiveBlock, "torso", (-25, -100), None),
+        ("rFoot", OffensiveBlock, "rKnee", (-25, -10), 1.5),
+        ("lKnee", DefensiveBlock, "torso", (25, -100), None),
+        ("lFoot", OffensiveBlock, "lKnee", (25, -10), 1.5)
+    ),
+    "joints": (
+        ("torsoRotationLimit", "rotary", "static", "torso", (-math.pi / 10, math.pi / 10)),
+        ("torsoLocationTie", "pin", "core", "torso", ((0, 0), (0, 0), 0)),
+
+        ("rUpperArm", "pin", "torso", "rElbow", ((0, 35), (0, 0), 40)),
+        ("rFistRotationLimit", "rotary", "static", "rFist", (-math.pi / 5, math.pi / 5)),
+        ("rLowerArm", "pin", "rElbow", "rFist", ((0, 0), (0, 0), 50)),
+
+        ("lUpperArm", "pin", "torso", "lElbow", ((0, 35), (0, 0), 40)),
+        ("lFistRotationLimit", "rotary", "static", "lFist", (-math.pi / 5, math.pi / 5)),
+        ("lLowerArm", "pin", "lElbow", "lFist", ((0, 0), (0, 0), 50)),
+
+        ("rUpperLeg", "pin", "torso", "rKnee", ((0, -50), (0, 0), 40)),
+        ("rFootRotationLimit", "rotary", "static", "rFoot", (-math.pi / 5, math.pi / 5)),
+        ("rLowerLeg", "pin", "rKnee", "rFoot", ((0, 0), (0, 25), 50)),
+        ("rLegDownwardForce", "spring", "core", "rFoot", ((0, 0), (0, 25), 300, 1250, 1)),
+
+        ("lUpperLeg", "pin", "torso", "lKnee", ((0, -50), (0, 0), 40)),
+        ("lFootRotationLimit", "rotary", "static", "lFoot", (-math.pi / 5, math.pi / 5)),
+        ("lLowerLeg", "pin", "lKnee", "lFoot", ((0, 0), (0, 25), 50)),
+        ("lLegDownwardForce", "spring", "core", "lFoot", ((0, 0), (0, 25), 300, 1250, 1))
+    ),
+    "limbs": (
+        ("rightLegAlive", "rKnee", ("rKnee", "rFoot")),
+        ("leftLegAlive", "lKnee", ("lKnee", "lFoot")),
+        ("rightArmAlive", "rElbow", ("rElbow", "rFist")),
+        ("leftArmAlive", "lElbow", ("lElbow", "lFist"))
+    )
+}
 
-    def punchRight(self):
-        self.rFist.shape.body.apply_impulse_at_local_point((Vec2d.zero() + (1, 0)) * 50000, (0, 0))
+# Per side: (horizontal spawn position as a fraction of the width, direction the fighter faces,
+# own collision group, opponent's collision group, event posted when this side is defeated)
+SIDES = {
+    1: (1 / 4, 1, "PLAYER1", "PLAYER2", PLAYERTWO_VICTOR),
+    2: (3 / 4, -1, "PLAYER2", "PLAYER1", PLAYERONE_VICTOR)
+}
 
-    def reversePunchRight(self):
-        self.rFist.shape.body.apply_impulse_at_local_point((Vec2d.zero() + (-1, 0)) * 50000, (0, 0))
 
-    def punchLeft(self):
-        self.lFist.shape.body.apply_impulse_at_local_point((Vec2d.zero() + (1, 0)) * 50000, (0, 0))
+def createJoint(kind, a, b, args):
+    if kind == "pin":
+        anchorA, anchorB, distance = args
+        joint = pm.PinJoint(a, b, anchorA, anchorB)
+        joint.distance = distance
+        return joint
+    if kind == "rotary":
+        return pm.RotaryLimitJoint(a, b, *args)
+    if kind == "spring":
+        return pm.DampedSpring(a, b, *args)
+    raise ValueError("Unknown joint kind: " + kind)
 
-    def reversePunchLeft(self):
-        self.lFist.shape.body.apply_impulse_at_local_point((Vec2d.zero() + (-1, 0)) * 50000, (0, 0))
 
+class Fighter():
+    """A ragdoll built from a skeleton description in a single pass.
 
-class PlayerTwo():
-    def __init__(self, space, screen):
+    side picks the spawn position, facing and collision group from SIDES. Facing only
+    mirrors the direction of the actions; both sides share the same skeleton layout.
+    """
+    def __init__(self, space, screen, side, size=None, skeleton=SKELETON):
         self.space = space
         self.screen = screen
-        width, height = screen.get_size()
-        pos = (3 * width / 4, height / 4)
-        shapeFilter = pm.ShapeFilter(collisionGroups["PLAYER2"], collisionGroups["PLAYER1"])
+        self.side = side
+        # A headless fighter has no screen and is placed using the arena size instead
+        width, height = size if screen is None else screen.get_size()
+        spawnX, self.facing, group, opponentGroup, self.victorEvent = SIDES[side]
+        pos = (spawnX * width, height / 4)
+        shapeFilter = pm.ShapeFilter(collisionGroups[group], collisionGroups[opponentGroup])
 
         self.coreBody = pm.Body(10, 1000)
         self.coreBody.position = pos
-
-        self.rightArmAlive = True
-        self.leftArmAlive = True
-        self.rightLegAlive = True
-        self.leftLegAlive = True
-
-        self.torso = Body(space, screen, 2)
-        self.torso.shape.filter = shapeFilter
-
-        self.torsoRotationLimit = pm.RotaryLimitJoint(self.space.static_body, self.torso.shape.body, -math.pi / 10,
-                                                      math.pi / 10)
-        self.torsoLocationTie = pm.PinJoint(self.coreBody, self.torso.shape.body)
-        self.torsoLocationTie.distance = 0
-        self.torso.shape.body.position = pos
-
-        # Set up arms
-        self.rElbow = DefensiveBlock(self.space, self.screen)
-        self.rElbow.shape.body.position = self.torso.shape.body.position + (-50, 35)
-        self.rElbow.shape.filter = shapeFilter
-
-        self.rUpperArm = pm.PinJoint(self.torso.shape.body, self.rElbow.shape.body, (0, 35), (0, 0))
-        self.rUpperArm.distance = 40
-
-        self.rFist = OffensiveBlock(self.space, self.screen)
-        self.rFist.shape.filter = shapeFilter
-        self.rFist.shape.body.position = self.rElbow.shape.body.position + (-25, 0)
-        self.rFistRotationLimit = pm.RotaryLimitJoint(self.space.static_body, self.rFist.shape.body, -math.pi / 5,
-                                                      math.pi / 5)
-
-        self.rLowerArm = pm.PinJoint(self.rElbow.shape.body, self.rFist.shape.body)
-        self.rLowerArm.distance = 50
-
-        self.lElbow = DefensiveBlock(self.space, self.screen)
-        self.lElbow.shape.body.position = self.torso.shape.body.position + (50, 35)
-        self.lElbow.shape.filter = shapeFilter
-
-        self.lUpperArm = pm.PinJoint(self.torso.shape.body, self.lElbow.shape.body, (0, 35), (0, 0))
-        self.lUpperArm.distance = 40
-
-        self.lFist = OffensiveBlock(self.space, self.screen)
-        self.lFist.shape.filter = shapeFilter
-
-        self.lFist.shape.body.position = self.lElbow.shape.body.position + (25, 0)
-        self.lFistRotationLimit = pm.RotaryLimitJoint(self.space.static_body, self.lFist.shape.body, -math.pi / 5,
-                                                      math.pi / 5)
-
-        self.lLowerArm = pm.PinJoint(self.lElbow.shape.body, self.lFist.shape.body)
-        self.lLowerArm.distance = 50
-
-        # Set up legs
-        self.rKnee = DefensiveBlock(self.space, self.screen)
-        self.rKnee.shape.body.position = self.torso.shape.body.position + (-25, -100)
-        self.rKnee.shape.filter = shapeFilter
-
-        self.rUpperLeg = pm.PinJoint(self.torso.shape.body, self.rKnee.shape.body, (0, -50), (0, 0))
-        self.rUpperLeg.distance = 40
-
-        self.rFoot = OffensiveBlock(self.space, self.screen)
-        self.rFoot.shape.friction = 1.5
-        self.rFoot.shape.filter = shapeFilter
-        self.rFoot.shape.body.position = self.rKnee.shape.body.position + (-25, -10)
-        self.rFootRotationLimit = pm.RotaryLimitJoint(self.space.static_body, self.rFoot.shape.body, -math.pi / 5,
-                                                      math.pi / 5)
-
-        self.rLowerLeg = pm.PinJoint(self.rKnee.shape.body, self.rFoot.shape.body, (0, 0), (0, 25))
-        self.rLowerLeg.distance = 50
-
-        self.lKnee = DefensiveBlock(self.space, self.screen)
-        self.lKnee.shape.body.position = self.torso.shape.body.position + (25, -100)
-        self.lKnee.shape.filter = shapeFilter
-
-        self.lUpperLeg = pm.PinJoint(self.torso.shape.body, self.lKnee.shape.body, (0, -50), (0, 0))
-        self.lUpperLeg.distance = 40
-
-        self.rLowerLeg = pm.PinJoint(self.rKnee.shape.body, self.rFoot.shape.body, (0, 0), (0, 25))
-        self.rLowerLeg.distance = 50
-
-        self.lKnee = DefensiveBlock(self.space, self.screen)
-        self.lKnee.shape.body.position = self.torso.shape.body.position + (25, -100)
-        self.lKnee.shape.filter = shapeFilter
-
-        self.lUpperLeg = pm.PinJoint(self.torso.shape.body, self.lKnee.shape.body, (0, -50), (0, 0))
-        self.lUpperLeg.distance = 40
-
-        self.lFoot = OffensiveBlock(self.space, self.screen)
-        self.lFoot.shape.friction = 1.5
-        self.lFoot.shape.filter = shapeFilter
-        self.lFoot.shape.body.position = self.lKnee.shape.body.position + (25, -10)
-        self.lFootRotationLimit = pm.RotaryLimitJoint(self.space.static_body, self.lFoot.shape.body, -math.pi / 5,
-                                                      math.pi / 5)
-
-        self.lLowerLeg = pm.PinJoint(self.lKnee.shape.body, self.lFoot.shape.body, (0, 0), (0, 25))
-        self.lLowerLeg.distance = 50
-
-        self.rLegDownwardForce = pm.DampedSpring(self.coreBody, self.rFoot.shape.body, (0, 0), (0, 25), 300, 1250, 1)
-        self.lLegDownwardForce = pm.DampedSpring(self.coreBody, self.lFoot.shape.body, (0, 0), (0, 25), 300, 1250, 1)
-
-        self.space.add(self.coreBody, self.torsoRotationLimit, self.torsoLocationTie,
-                       self.rUpperLeg, self.rLegDownwardForce, self.lUpperLeg, self.lLegDownwardForce,
-                       self.rFootRotationLimit, self.lFootRotationLimit,
-                       self.rFistRotationLimit, self.lFistRotationLimit,
-                       self.lLowerLeg, self.rLowerLeg,
-                       self.rUpperArm, self.rLowerArm,
-                       self.lUpperArm, self.lLowerArm)
+        self.defeated = False
+        # Bodies drawn away from where they are, by (dx, dy), while netplay fades in a correction
+        self.drawOffsets = {}
+        # A Debris.DebrisPool that gets a copy of every limb that comes off, set by the arena
+        self.debris = None
+
+        bodies = {"core": self.coreBody, "static": space.static_body}
+        toAdd = [self.coreBody]
+        self.parts = []
+        for name, blockClass, relativeTo, offset, friction in skeleton["parts"]:
+            if blockClass is Body:
+                part = Body(space, screen, side, add=False)
+            else:
+                part = blockClass(space, screen, add=False)
+            part.shape.filter = shapeFilter
+            part.shape.side = side
+            part.shape.partName = name
+            if friction is not None:
+                part.shape.friction = friction
+            origin = pos if relativeTo is None else bodies[relativeTo].position
+            part.shape.body.position = Vec2d(origin) + offset
+
+            setattr(self, name, part)
+            self.parts.append(part)
+            bodies[name] = part.shape.body
+            toAdd.extend((part.shape.body, part.shape))
+
+        self.skeleton = skeleton
+        self.bodies = bodies
+        self.partMembers = toAdd
+        # Every body and health shape of the fighter in a fixed order, for snapshots
+        self.movingBodies = [self.coreBody] + [part.shape.body for part in self.parts]
+        self.healthShapes = [part.shape for part in self.parts if hasattr(part.shape, "maxHealth")]
+        self.spawn = [(body, Vec2d(body.position)) for body in self.movingBodies]
+        self.buildJoints()
+
+        # The collision system tells us once when a joint or the torso runs out of health
+        collisions = Collision.systemFor(space)
+        for limb in self.limbs:
+            collisions.watch(limb[1].shape, self.limbDied)
+        collisions.watch(self.torso.shape, self.torsoDied)
+
+        self.space.add(*self.members)
+
+    def buildJoints(self):
+        """Create the joints and limbs from the skeleton, without adding them to the space."""
+        bodies = self.bodies
+        jointsByPart = {}
+        joints = []
+        # Pin joints drawn as lines, joined into polylines where one pin ends where the next starts.
+        # Each chain is (joints in it, [(body, anchor x, anchor y), ...]).
+        self.jointChains = []
+        for name, kind, a, b, args in self.skeleton["joints"]:
+            joint = createJoint(kind, bodies[a], bodies[b], args)
+            setattr(self, name, joint)
+            joints.append(joint)
+            for partName in (a, b):
+                jointsByPart.setdefault(partName, []).append(joint)
+
+            if kind == "pin":
+                anchorA, anchorB = args[0], args[1]
+                start = (bodies[a], anchorA[0], anchorA[1])
+                end = (bodies[b], anchorB[0], anchorB[1])
+                for chainJoints, points in self.jointChains:
+                    if points[-1] == start:
+                        chainJoints.append(joint)
+                        points.append(end)
+                        break
+                else:
+                    self.jointChains.append(([joint], [start, end]))
+
+        # Everything that leaves the space when a limb breaks off
+        self.limbs = []
+        self.limbsByShape = {}
+        for aliveFlag, healthPart, limbParts in self.skeleton["limbs"]:
+            setattr(self, aliveFlag, True)
+            removed = []
+            for partName in limbParts:
+                part = getattr(self, partName)
+                removed.extend((part.shape.body, part.shape))
+                for joint in jointsByPart.get(partName, ()):
+                    if joint not in removed:
+                        removed.append(joint)
+            limb = (aliveFlag, getattr(self, healthPart), [getattr(self, p) for p in limbParts], removed)
+            self.limbs.append(limb)
+            self.limbsByShape[limb[1].shape] = limb
+
+        self.joints = joints
+        # jointChains loses the chains of limbs that break off, this keeps them all
+        self.allJointChains = list(self.jointChains)
+        self.members = self.partMembers + joints
+        # Limb flags of the last time the fighter was added to the space in build order. While they
+        # still match, no joint left since, so chipmunk still solves the joints in that order.
+        self.attachedLimbs = self.limbFlags()
+
+    def limbFlags(self):
+        """One byte per limb, 1 while it is attached."""
+        return bytes(getattr(self, limb[0]) for limb in self.limbs)
+
+    def lostMembers(self):
+        """Everything that left the space with the limbs that broke off."""
+        lost = set()
+        for aliveFlag, healthPart, limbParts, removed in self.limbs:
+            if not getattr(self, aliveFlag):
+                lost.update(removed)
+        return lost
+
+    def detach(self):
+        """Take everything of the fighter that is still in the space out of it."""
+        lost = self.lostMembers()
+        self.space.remove(*[item for item in self.members if item not in lost])
+
+    def reset(self):
+        """Put the fighter back in its spawn pose with full health and every limb attached.
+
+        Call detach() first. The fighter is added back in the order it was built, with new
+        joints, so no contacts or solver impulses from the last match carry over.
+        """
+        for body, position in self.spawn:
+            body.position = position
+            body.angle = 0
+            body.velocity = (0, 0)
+            body.angular_velocity = 0
+            body.force = (0, 0)
+            body.torque = 0
+
+        for part in self.parts:
+            if hasattr(part.shape, "maxHealth"):
+                part.shape.health = part.shape.maxHealth
+        self.buildJoints()
+        self.space.add(*self.members)
+        self.defeated = False
+
+    def breakLimb(self, limb):
+        """Mark a limb as lost and return what has to leave the space, nothing if it already left."""
+        aliveFlag, healthPart, limbParts, removed = limb
+        if not getattr(self, aliveFlag):
+            return ()
+        setattr(self, aliveFlag, False)
+        if self.debris is not None:
+            self.debris.spawn(limbParts)
+        self.jointChains = [chain for chain in self.jointChains
+                            if not any(joint in removed for joint in chain[0])]
+        self.checkForDefeat()
+        return removed
+
+    def restoreLimbs(self, alive):
+        """Mark exactly the limbs flagged in alive as attached, one flag per limb, ignoring health.
+
+        Call while the fighter is detached; attach() puts the parts and joints of those limbs back.
+        The joints are kept, see Snapshot.flushSolver for clearing what they remember.
+        """
+        for limb, flag in zip(self.limbs, alive):
+            setattr(self, limb[0], bool(flag))
+        lost = self.lostMembers()
+        self.jointChains = [chain for chain in self.allJointChains
+                            if not any(joint in lost for joint in chain[0])]
+
+    def attach(self):
+        """Add everything of the fighter's attached limbs back to the space, in the order it was built."""
+        lost = self.lostMembers()
+        self.space.add(*[item for item in self.members if item not in lost])
+        self.attachedLimbs = self.limbFlags()
+
+    def limbDied(self, shape):
+        return self.breakLimb(self.limbsByShape[shape])
+
+    def torsoDied(self, shape):
+        self.checkForDefeat()
+        return ()
+
+    def checkForDefeat(self):
+        if self.defeated:
+            return
+        if (not self.leftLegAlive and not self.rightLegAlive
+                and not self.leftArmAlive and not self.rightArmAlive) or (self.torso.shape.health <= 0):
+            self.defeated = True
+            # Netplay clears victorEvent and announces the result once it is confirmed
+            if self.screen is not None and self.victorEvent is not None:
+                pygame.event.post(pygame.event.Event(self.victorEvent, {}))
 
     def checkForDeath(self):
-        if self.rightLegAlive:
-            if self.rKnee.shape.health <= 0:
-                self.rightLegAlive = False
-                self.space.remove(
-                    self.rKnee.shape.body,
-                    self.rKnee.shape,
-                    self.rUpperLeg,
-                    self.rLowerLeg,
-                    self.rLegDownwardForce,
-                    self.rFootRotationLimit,
-                    self.rFoot.shape.body,
-                    self.rFoot.shape
-                )
-
-        if self.leftLegAlive:
-            if self.lKnee.shape.health <= 0:
-                self.leftLegAlive = False
-                self.space.remove(
-                    self.lKnee.shape.body,
-                    self.lKnee.shape,
-                    self.lUpperLeg,
-                    self.lLowerLeg,
-                    self.lFootRotationLimit,
-                    self.lLegDownwardForce,
-                    self.lFoot.shape.body,
-                    self.lFoot.shape
-                )
-
-        if self.rightArmAlive:
-            if self.rElbow.shape.health <= 0:
-                self.rightArmAlive = False
-                self.space.remove(
-                    self.rFist.shape.body, self.rFist.shape,
-                    self.rFistRotationLimit,
-                    self.rElbow.shape.body, self.rElbow.shape,
-                    self.rUpperArm,
-                    self.rLowerArm
-                )
-
-        if self.leftArmAlive:
-            if self.lElbow.shape.health <= 0:
-                self.leftArmAlive = False
-                self.space.remove(
-                    self.lFist.shape, self.lFist.shape.body,
-                    self.lFistRotationLimit,
-                    self.lElbow.shape, self.lElbow.shape.body,
-                    self.lUpperArm, self.lLowerArm
-                )
-        if (not self.leftLegAlive and not self.rightLegAlive
-                and not self.leftArmAlive and not self.rightArmAlive) or (self.torso.shape.health == 0):
-            pygame.event.post(pygame.event.Event(PLAYERONE_VICTOR, {}))
+        """Check every limb's health again, for when health was changed outside of a collision."""
+        removed = []
+        for limb in self.limbs:
+            if limb[1].shape.health <= 0:
+                removed.extend(self.breakLimb(limb))
+        if removed:
+            self.space.remove(*removed)
+        self.checkForDefeat()
 
     def update(self):
-        self.checkForDeath()
-        if self.leftArmAlive:
-            self.lElbow.update()
-            self.lFist.update()
-
-        if self.leftLegAlive:
-            self.lFoot.update()
-            self.lKnee.update()
+        """Draw the fighter and return the screen rects it covered."""
+        drawn = []
+        offsets = self.drawOffsets
 
         if self.torso.shape.health > 0:
-            self.torso.update()
-
-        if self.rightArmAlive:
-            self.rElbow.update()
-            self.rFist.update()
-
-        if self.rightLegAlive:
-            self.rFoot.update()
-            self.rKnee.update()
-
-
+            drawn.append(self.torso.update(offsets.get(self.torso.shape.body)))
+
+        for aliveFlag, healthPart, limbParts, removed in self.limbs:
+            if getattr(self, aliveFlag):
+                for part in limbParts:
+                    drawn.append(part.update(offsets.get(part.shape.body)))
+        return drawn
+
+    def drawJoints(self, color):
+        """Draw every pin joint still attached as light lines and return the rects covered."""
+        height = self.screen.get_height()
+        offsets = self.drawOffsets
+        lines = []
+        for joints, points in self.jointChains:
+            line = []
+            for body, x, y in points:
+                p = body.position
+                offset = offsets.get(body)
+                if offset is not None:
+                    p = p + offset
+                line.append((int(p.x + x), int(height - p.y - y)))
+            lines.append(line)
+        return [pygame.draw.aalines(self.screen, color, False, line) for line in lines]
+
+    def push(self, part, direction, strength):
+        part.shape.body.apply_impulse_at_local_point((Vec2d.zero() + direction) * strength, (0, 0))
 
     def kickRFoot(self):
-        self.rFoot.shape.body.apply_impulse_at_local_point((Vec2d.zero() + (-1, math.sqrt(2) / 2)) * 25000, (0, 0))
+        self.push(self.rFoot, (self.facing, math.sqrt(2) / 2), 25000)
 
     def reverseKickRFoot(self):
-        self.rFoot.shape.body.apply_impulse_at_local_point((Vec2d.zero() + (1, math.sqrt(2) / 2)) * 25000, (0, 0))
+        self.push(self.rFoot, (-self.facing, math.sqrt(2) / 2), 25000)
 
     def kickLFoot(self):
-        self.lFoot.shape.body.apply_impulse_at_local_point((Vec2d.zero() + (-1, math.sqrt(2) / 2)) * 25000, (0, 0))
+        self.push(self.lFoot, (self.facing, math.sqrt(2) / 2), 25000)
 
     def reverseKickLFoot(self):
-        self.lFoot.shape.body.apply_impulse_at_local_point((Vec2d.zero() + (1, math.sqrt(2) / 2)) * 25000, (0, 0))
+        self.push(self.lFoot, (-self.facing, math.sqrt(2) / 2), 25000)
 
     def punchRight(self):
-        self.rFist.shape.body.apply_impulse_at_local_point((Vec2d.zero() + (-1, 0)) * 50000, (0, 0))
+        self.push(self.rFist, (self.facing, 0), 50000)
 
     def reversePunchRight(self):
-        self.rFist.shape.body.apply_impulse_at_local_point((Vec2d.zero() + (1, 0)) * 50000, (0, 0))
+        self.push(self.rFist, (-self.facing, 0), 50000)
 
     def punchLeft(self):
-        self.lFist.shape.body.apply_impulse_at_local_point((Vec2d.zero() + (-1, 0)) * 50000, (0, 0))
+        self.push(self.lFist, (self.facing, 0), 50000)
 
     def reversePunchLeft(self):
-        self.lFist.shape.body.apply_impulse_at_local_point((Vec2d.zero() + (1, 0)) * 50000, (0, 0))
+        self.push(self.lFist, (-self.facing, 0), 50000)
+
+
+class PlayerOne(Fighter):
+    def __init__(self, space, screen, size=None):
+        Fighter.__init__(self, space, screen, 1, size)
+
+
+class PlayerTwo(Fighter):
+    def __init__(self, space, screen, size=None):
+        Fighter.__init__(self, space, screen, 2, size)
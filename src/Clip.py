@@ -0,0 +1,232 @@
+# File: Clip.py
+# Renders matches off screen to image sequences or videos, writing the frames on a background thread
+
+import argparse
+import multiprocessing
+import os
+import queue
+import shutil
+import struct
+import subprocess
+import threading
+
+# Run without a real window or sound card when rendering from the command line
+if __name__ == '__main__':
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+from pygame.color import THECOLORS
+import Arena
+import Assets
+import Replay
+
+# Frames waiting to be written at most, about 328 MB of 800x800 frames at 4 bytes a pixel
+QUEUE_SIZE = 128
+# The game's own writer drops frames rather than waiting, so it keeps a short queue: about 20 MB
+GAME_QUEUE_SIZE = 8
+# What happens to a frame that arrives while the queue is full
+DROP_NEWEST = "newest"  # the frame is dropped
+DROP_OLDEST = "oldest"  # the oldest waiting frame is dropped to make room
+WAIT = "wait"  # the caller waits for room, only for loops that don't have to keep time
+POLICIES = (DROP_NEWEST, DROP_OLDEST, WAIT)
+# Extensions written through ffmpeg instead of as one image per frame
+VIDEO_EXTENSIONS = (".mp4", ".mkv", ".webm", ".avi", ".mov", ".gif")
+# Frames are copied in the screen's own 32 bit layout, which takes a tenth of the time of packing RGB
+PIXEL_FORMAT = "RGBX"
+# Frame number sent ahead of each frame's pixels to the process saving images
+FRAME = struct.Struct("<I")
+BACKGROUND = THECOLORS["white"]
+JOINT_COLOR = THECOLORS["lightgray"]
+
+
+def isVideo(path):
+    return os.path.splitext(path)[1].lower() in VIDEO_EXTENSIONS
+
+
+def saveFrames(connection, path, size):
+    """Save every frame sent over connection as an image, until an empty message arrives."""
+    while True:
+        header = connection.recv_bytes()
+        if not header:
+            return
+        frame, = FRAME.unpack(header)
+        pygame.image.save(pygame.image.frombuffer(connection.recv_bytes(), size, PIXEL_FORMAT), path % frame)
+
+
+class FrameWriter():
+    """Writes frames to path from its own thread, so whoever submits them never waits for the disk.
+
+    A path with a %d in it, like clip/frame-%05d.png, gets one image per frame numbered by the
+    frame passed to submit(), saved by a child process since compressing them holds the GIL.
+    A video path is encoded by an ffmpeg process, which has to be on the PATH. Frames are copied
+    as raw pixels into a queue of queueSize; when it is full the drop policy picks what to lose,
+    see POLICIES. written counts the frames handed to the encoding process.
+    """
+    def __init__(self, path, size, fps=Arena.FPS, queueSize=QUEUE_SIZE, drop=DROP_NEWEST):
+        if drop not in POLICIES:
+            raise ValueError("Unknown drop policy: %s" % drop)
+        self.path = path
+        self.size = size
+        self.drop = drop
+        self.queue = queue.Queue(queueSize)
+        self.submitted = 0
+        self.dropped = 0
+        self.written = 0
+        self.error = None
+        self.encoder = None
+        self.saver = None
+        self.connection = None
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if isVideo(path):
+            ffmpeg = shutil.which("ffmpeg")
+            if ffmpeg is None:
+                raise ValueError("Writing %s needs ffmpeg on the PATH; use an image pattern like frame-%%05d.png" % path)
+            # rgb0 is ffmpeg's name for the RGBX layout
+            self.encoder = subprocess.Popen(
+                [ffmpeg, "-loglevel", "error", "-y", "-f", "rawvideo", "-pix_fmt", "rgb0",
+                 "-s", "%dx%d" % size, "-r", str(fps), "-i", "-", "-pix_fmt", "yuv420p", path],
+                stdin=subprocess.PIPE)
+        elif "%" in path:
+            receiver, self.connection = multiprocessing.Pipe(duplex=False)
+            self.saver = multiprocessing.Process(target=saveFrames, args=(receiver, path, size),
+                                                 name="frame saver", daemon=True)
+            self.saver.start()
+            receiver.close()
+        else:
+            raise ValueError("Image sequence paths need a frame number pattern, like frame-%05d.png")
+        self.thread = threading.Thread(target=self.run, name="frame writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, surface, frame=None):
+        """Queue the pixels of surface as frame number frame, by default the count of frames submitted.
+
+        Returns False if a frame was dropped.
+        """
+        if frame is None:
+            frame = self.submitted
+        data = pygame.image.tobytes(surface, PIXEL_FORMAT)
+        self.submitted += 1
+        if self.drop == WAIT:
+            self.queue.put((frame, data))
+            return True
+        try:
+            self.queue.put_nowait((frame, data))
+            return True
+        except queue.Full:
+            pass
+        self.dropped += 1
+        if self.drop == DROP_OLDEST:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                pass
+            self.queue.put_nowait((frame, data))
+        return False
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            # After a failed write the rest is thrown away, so nobody waits on a full queue forever
+            if self.error is not None:
+                continue
+            frame, data = item
+            try:
+                if self.encoder is not None:
+                    self.encoder.stdin.write(data)
+                else:
+                    self.connection.send_bytes(FRAME.pack(frame))
+                    self.connection.send_bytes(data)
+                self.written += 1
+            except OSError as error:
+                self.error = error
+
+    def close(self):
+        """Write whatever is still queued and finish the file; raises the first error writing it."""
+        self.queue.put(None)
+        self.thread.join()
+        if self.encoder is not None:
+            try:
+                self.encoder.stdin.close()
+            except OSError:
+                pass
+            if self.encoder.wait() != 0 and self.error is None:
+                self.error = "ffmpeg exited with status %d" % self.encoder.returncode
+        if self.saver is not None:
+            try:
+                self.connection.send_bytes(b"")
+            except OSError:
+                pass
+            self.connection.close()
+            self.saver.join()
+            if self.saver.exitcode != 0 and self.error is None:
+                self.error = "the saving process exited with status %d" % self.saver.exitcode
+        if self.error is not None:
+            raise IOError("Writing %s failed: %s" % (self.path, self.error))
+
+
+def drawArena(arena, color=BACKGROUND):
+    """Draw everything in arena onto its screen, the same way the game does."""
+    arena.screen.fill(color)
+    arena.playerOne.update()
+    arena.playerTwo.update()
+    arena.debris.draw()
+    arena.playerOne.drawJoints(JOINT_COLOR)
+    arena.playerTwo.drawJoints(JOINT_COLOR)
+
+
+def renderReplay(replayPath, outPath, every=1, tail=Arena.FPS, maxFrames=None, drop=WAIT):
+    """Play a replay as fast as it runs and write every every-th frame of it to outPath.
+
+    Drawing goes to a Surface that is never shown. tail frames more are kept after the match
+    is decided so the clip shows the fall, as far as the recording goes; a match without a
+    winner ends where the recording stopped, or earlier at maxFrames. Returns the FrameWriter,
+    closed, for its counts.
+    """
+    size, inputs, endFrame = Replay.load(replayPath)
+    if maxFrames is not None:
+        endFrame = min(endFrame, maxFrames)
+    if not pygame.display.get_init():
+        pygame.display.init()
+    # Images are converted to the display format, so a display mode has to exist even though nothing is shown
+    if pygame.display.get_surface() is None:
+        pygame.display.set_mode((1, 1))
+    Assets.preload()
+
+    surface = pygame.Surface(size)
+    arena = Arena.Arena(surface)
+    player = Replay.ReplayPlayer(inputs, endFrame)
+    arena.replay = player
+    writer = FrameWriter(outPath, size, Arena.FPS / float(every), drop=drop)
+    try:
+        while not player.ended(arena):
+            if arena.frame % every == 0:
+                drawArena(arena)
+                writer.submit(surface, arena.frame // every)
+            arena.step()
+            if arena.isOver():
+                player.endFrame = min(player.endFrame, arena.frame + tail)
+    finally:
+        writer.close()
+    return writer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render a recorded Block Fight match to images or a video")
+    parser.add_argument("replay", help="replay file saved with BlockFight.py --record")
+    parser.add_argument("--out", default="clip/frame-%05d.png",
+                        help="image pattern with a frame number, or a video file written with ffmpeg")
+    parser.add_argument("--every", type=int, default=1, help="keep one frame in this many")
+    parser.add_argument("--drop", choices=POLICIES, default=WAIT,
+                        help="what to do when frames come faster than they are written")
+    args = parser.parse_args()
+    writer = renderReplay(args.replay, args.out, args.every, drop=args.drop)
+    print("Wrote %d frames to %s, dropped %d" % (writer.written, args.out, writer.dropped))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+# File: Collision.py
+# One collision subsystem per space that turns hard hits into damage
+
+import Assets
+import CombatLog
+
+COLLISION_BODY = 1
+COLLISION_OFFENSE = 2
+COLLISION_DEFENSE = 3
+
+# Impulse a hit needs before it does damage
+BODY_THRESHOLD = 1500
+DEFENSE_THRESHOLD = 1000
+
+
+class CollisionSystem():
+    """Registers the body/offense and defense/offense handlers once for a space.
+
+    Damaging shapes are looked up in a table of shape -> (squared threshold, damage) so the
+    callback only does arithmetic. Sounds for the hits and the callbacks of watched shapes
+    that ran out of health are handled by flush() after the step.
+    """
+    def __init__(self, space):
+        self.space = space
+        self.rules = {}
+        self.listeners = {}
+        self.hits = []
+        self.deaths = []
+        self.contacts = 0
+        self.log = None
+        self.stepper = None
+        # Played once per frame with hits, as soon as it has been loaded; None keeps the space silent
+        self.soundPath = Assets.SMACK_SOUND
+        for collisionType in (COLLISION_BODY, COLLISION_DEFENSE):
+            handler = space.add_collision_handler(collisionType, COLLISION_OFFENSE)
+            handler.post_solve = self.collisionAction
+
+    def register(self, shape, threshold, damage=1):
+        self.rules[shape] = (threshold * threshold, damage)
+
+    def watch(self, shape, callback):
+        """Call callback(shape) once, from flush(), when the health of shape drops to 0 or below.
+
+        The callback returns the bodies, shapes and constraints that should leave the space.
+        """
+        self.listeners[shape] = callback
+
+    def reset(self):
+        """Forget hits and deaths that haven't been flushed yet."""
+        del self.hits[:]
+        del self.deaths[:]
+
+    def attachLog(self, log, stepper):
+        """Record contacts into log, stamped with the frame and substep of stepper."""
+        self.log = log
+        self.stepper = stepper
+
+    def collisionAction(self, arbiter, space, data):
+        self.contacts += 1
+        if arbiter.is_first_contact:
+            a, b = arbiter.shapes
+            rule = self.rules.get(a)
+            if rule is not None:
+                x, y = arbiter.total_impulse
+                impulseSquared = x * x + y * y
+                damage = 0
+                if impulseSquared > rule[0]:
+                    damage = rule[1]
+                    a.health = a.health - damage
+                    self.hits.append(a)
+                    if a.health <= 0 < a.health + damage and a in self.listeners:
+                        self.deaths.append(a)
+
+                log = self.log
+                if log is not None and log.level >= (CombatLog.HITS if damage else CombatLog.CONTACTS):
+                    log.record(self.stepper.frame, self.stepper.substep, a, b, impulseSquared, damage)
+
+        return True
+
+    def flush(self):
+        """Handle the hits collected since the last flush. Call outside of space.step."""
+        if self.hits and self.soundPath is not None:
+            effect = Assets.loadedSound(self.soundPath)
+            if effect is not None:
+                effect.play()
+        del self.hits[:]
+
+        if self.deaths:
+            removed = []
+            for shape in self.deaths:
+                removed.extend(self.listeners[shape](shape))
+            del self.deaths[:]
+            # Everything that broke off this frame leaves the space together
+            if removed:
+                self.space.remove(*removed)
+
+        if self.log is not None:
+            self.log.endFrame()
+
+
+def systemFor(space):
+    """The CollisionSystem of space, created on first use."""
+    system = getattr(space, "collisionSystem", None)
+    if system is None:
+        system = CollisionSystem(space)
+        space.collisionSystem = system
+    return system
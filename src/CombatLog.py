@@ -0,0 +1,105 @@
+# File: CombatLog.py
+# Buffered combat event stream written to a JSON-lines file by a background thread
+
+import json
+import math
+import queue
+import threading
+
+# Verbosity levels
+OFF = 0
+HITS = 1  # only contacts that did damage
+CONTACTS = 2  # every first contact between a limb and a fist or foot
+
+
+def shapeName(shape):
+    """'<side>.<part>' for fighter shapes, e.g. '1.rElbow'."""
+    partName = getattr(shape, "partName", None)
+    if partName is None:
+        return "?"
+    return "%d.%s" % (shape.side, partName)
+
+
+class CombatLog():
+    """Ring buffer of contact records handed to a writer thread in batches.
+
+    record() runs inside the solver callback, so it only stores a tuple. endFrame() is called
+    once per frame and passes a full batch to the writer, which does the formatting and I/O.
+    When the ring overflows the oldest records are overwritten and counted in dropped.
+    """
+    def __init__(self, path, level=HITS, capacity=4096, batchSize=256, maxPendingBatches=64):
+        self.path = path
+        self.level = level
+        self.capacity = capacity
+        self.batchSize = batchSize
+        self.ring = [None] * capacity
+        self.start = 0
+        self.count = 0
+        self.dropped = 0
+        self.written = 0
+        self.batches = queue.Queue(maxPendingBatches)
+        self.writer = threading.Thread(target=self.writeLoop, name="CombatLogWriter", daemon=True)
+        self.writer.start()
+
+    def record(self, frame, substep, a, b, impulseSquared, damage):
+        if self.count == self.capacity:
+            self.ring[self.start] = (frame, substep, a, b, impulseSquared, damage)
+            self.start = (self.start + 1) % self.capacity
+            self.dropped += 1
+        else:
+            self.ring[(self.start + self.count) % self.capacity] = (frame, substep, a, b, impulseSquared, damage)
+            self.count += 1
+
+    def endFrame(self):
+        if self.count >= self.batchSize:
+            self.flush()
+
+    def flush(self):
+        """Hand everything buffered so far to the writer without waiting for it."""
+        if self.count == 0:
+            return
+        end = self.start + self.count
+        if end <= self.capacity:
+            batch = self.ring[self.start:end]
+        else:
+            batch = self.ring[self.start:] + self.ring[:end - self.capacity]
+        self.start = 0
+        self.count = 0
+        try:
+            self.batches.put_nowait(batch)
+        except queue.Full:
+            self.dropped += len(batch)
+
+    def close(self):
+        """Flush what is left and wait for the writer to finish the file."""
+        self.flush()
+        self.batches.put(None)
+        self.writer.join()
+
+    def writeLoop(self):
+        with open(self.path, "w") as logFile:
+            while True:
+                batch = self.batches.get()
+                if batch is None:
+                    break
+                lines = []
+                for frame, substep, a, b, impulseSquared, damage in batch:
+                    lines.append(json.dumps({
+                        "frame": frame,
+                        "substep": substep,
+                        "shape": shapeName(a),
+                        "other": shapeName(b),
+                        "impulse": round(math.sqrt(impulseSquared), 1),
+                        "damage": damage
+                    }, separators=(",", ":")))
+                logFile.write("\n".join(lines) + "\n")
+                logFile.flush()
+                self.written += len(batch)
+
+
+def read(path):
+    """Yield the records of a log file as dictionaries, in the order they happened."""
+    with open(path) as logFile:
+        for line in logFile:
+            if line.strip():
+                yield json.loads(line)
@@ -0,0 +1,126 @@
+# File: Controls.py
+# Keyboard bindings loaded from a config file and turned into fighter actions with one lookup per event
+
+import collections
+import json
+import pygame
+from pygame.locals import KEYDOWN
+import Character
+
+CONTROLS_PATH = "../assets/config/controls.json"
+# Frames between repeats of an action bound to a held key
+HOLD_REPEAT = 10
+# Frames a combo may take from its first action to its last
+COMBO_WINDOW = 20
+
+
+def bindings(section):
+    """A config section {player: {key name: action}} as {key code: (player, action)}.
+
+    Key names are the ones pygame.key.name() gives, like "f", "," or "left shift".
+    """
+    table = {}
+    for player, keys in section.items():
+        for name, action in keys.items():
+            if action not in Character.ACTIONS:
+                raise ValueError("Unknown action for key %s: %s" % (name, action))
+            table[pygame.key.key_code(name)] = (int(player), action)
+    return table
+
+
+class Combo():
+    """Actions done in order within window frames, which queue the actions in then."""
+    def __init__(self, name, sequence, then, window=COMBO_WINDOW):
+        for action in list(sequence) + list(then):
+            if action not in Character.ACTIONS:
+                raise ValueError("Unknown action in combo %s: %s" % (name, action))
+        self.name = name
+        self.sequence = tuple(sequence)
+        self.then = tuple(then)
+        self.window = window
+
+    def matches(self, history, frame):
+        """Whether history, the latest (frame, action) of a player, ends with this combo."""
+        count = len(self.sequence)
+        if len(history) < count:
+            return False
+        recent = list(history)[-count:]
+        if frame - recent[0][0] > self.window:
+            return False
+        return tuple(action for actionFrame, action in recent) == self.sequence
+
+
+class Keymap():
+    """Which key does what: press and hold map a key code to (player, action)."""
+    def __init__(self, press, hold=None, holdRepeat=HOLD_REPEAT, combos=()):
+        self.press = press
+        self.hold = hold or {}
+        self.holdRepeat = holdRepeat
+        self.combos = tuple(combos)
+        self.historyLength = max([len(combo.sequence) for combo in self.combos] + [1])
+
+
+def load(path=CONTROLS_PATH):
+    """Read a Keymap from a JSON config file. Needs pygame to be initialized."""
+    with open(path) as configFile:
+        config = json.load(configFile)
+    combos = [Combo(combo["name"], combo["sequence"], combo["then"], combo.get("window", COMBO_WINDOW))
+              for combo in config.get("combos", ())]
+    return Keymap(bindings(config.get("press", {})), bindings(config.get("hold", {})),
+                  config.get("holdRepeat", HOLD_REPEAT), combos)
+
+
+class Controls():
+    """Drives act(player, action), e.g. Arena.act, from the keyboard for one match.
+
+    handle() does a key press's action with one dictionary lookup, however many keys are
+    bound. update() runs once per frame: it repeats the actions of held keys and releases
+    one queued combo action per player.
+    """
+    def __init__(self, keymap, act):
+        self.keymap = keymap
+        self.act = act
+        self.frame = 0
+        # Frame each held key last acted on
+        self.held = {}
+        self.history = collections.defaultdict(lambda: collections.deque(maxlen=keymap.historyLength))
+        self.queued = collections.defaultdict(collections.deque)
+
+    def handle(self, event):
+        """Act on a KEYDOWN bound to an action; returns whether the event was used."""
+        if event.type != KEYDOWN:
+            return False
+        binding = self.keymap.press.get(event.key)
+        if binding is None:
+            return False
+        self.perform(*binding)
+        return True
+
+    def perform(self, player, action):
+        self.act(player, action)
+        if self.keymap.combos:
+            history = self.history[player]
+            history.append((self.frame, action))
+            for combo in self.keymap.combos:
+                if combo.matches(history, self.frame):
+                    self.queued[player].extend(combo.then)
+                    history.clear()
+                    break
+
+    def update(self, frame):
+        self.frame = frame
+        hold = self.keymap.hold
+        if hold:
+            pressed = pygame.key.get_pressed()
+            for key, binding in hold.items():
+                if pressed[key]:
+                    last = self.held.get(key)
+                    if last is None or frame - last >= self.keymap.holdRepeat:
+                        self.held[key] = frame
+                        self.perform(*binding)
+                else:
+                    self.held.pop(key, None)
+
+        for player, queue in self.queued.items():
+            if queue:
+                self.act(player, queue.popleft())
@@ -0,0 +1,95 @@
+# File: Debris.py
+# Severed limbs tumble to the floor as short-lived copies that are recycled once they come to rest
+
+import pymunk as pm
+from Character import PymunkSprite
+
+# Frames a piece of debris stays around at most, 4 seconds at the regular frame rate
+MAX_AGE = 200
+# Most blocks have no friction and would slide along the floor forever
+FRICTION = 0.8
+# Debris only collides with the walls and other debris, never with a fighter
+DEBRIS_GROUP = 0b100
+DEBRIS_FILTER = pm.ShapeFilter(categories=DEBRIS_GROUP, mask=pm.ShapeFilter.ALL_MASKS ^ 0b11)
+
+
+class DebrisPool():
+    """Pieces of debris for the severed limbs of a space's fighters.
+
+    spawn() puts a copy of each severed part where the part was, moving the same way, while
+    the part itself leaves the space as before. Once a piece falls asleep on the floor, or
+    after MAX_AGE frames, it leaves the space and waits in the pool for the next limb.
+    """
+    def __init__(self, space, screen, stepper=None):
+        self.space = space
+        self.screen = screen
+        self.stepper = stepper
+        self.frame = 0
+        # [(piece, frame it was spawned on)] in the space, and idle pieces by image and outline
+        self.active = []
+        self.idle = {}
+        self.created = 0
+
+    def take(self, part):
+        vertices = tuple(tuple(vertex) for vertex in part.shape.get_vertices())
+        key = (part.image, vertices)
+        idle = self.idle.get(key)
+        if idle:
+            return idle.pop()
+
+        body = pm.Body(part.shape.body.mass, part.shape.body.moment)
+        shape = pm.Poly(body, vertices)
+        shape.friction = FRICTION
+        shape.filter = DEBRIS_FILTER
+        piece = PymunkSprite(self.space, self.screen, part.image, shape, add=False)
+        piece.key = key
+        self.created += 1
+        return piece
+
+    def spawn(self, parts):
+        """Copy parts, the blocks of a limb that just came off, into the space as debris."""
+        for part in parts:
+            piece = self.take(part)
+            source = part.shape.body
+            body = piece.shape.body
+            body.position = source.position
+            body.angle = source.angle
+            body.velocity = source.velocity
+            body.angular_velocity = source.angular_velocity
+            self.space.add(body, piece.shape)
+            if self.stepper is not None:
+                self.stepper.ignored.add(body)
+            self.active.append((piece, self.frame))
+
+    def recycle(self, piece):
+        self.space.remove(piece.shape.body, piece.shape)
+        if self.stepper is not None:
+            self.stepper.ignored.discard(piece.shape.body)
+        self.idle.setdefault(piece.key, []).append(piece)
+
+    def update(self, frame):
+        """Recycle the pieces that came to rest or got too old. Call between frames."""
+        self.frame = frame
+        if not self.active:
+            return
+        remaining = []
+        for piece, spawned in self.active:
+            if piece.shape.body.is_sleeping or frame - spawned > MAX_AGE:
+                self.recycle(piece)
+            else:
+                remaining.append((piece, spawned))
+        self.active = remaining
+
+    def clear(self, since=0):
+        """Recycle every piece spawned on frame since or later, e.g. after going back to a snapshot."""
+        remaining = []
+        for piece, spawned in self.active:
+            if spawned >= since:
+                self.recycle(piece)
+            else:
+                remaining.append((piece, spawned))
+        self.active = remaining
+
+    def draw(self):
+        """Draw the pieces in the space and return the rects covered."""
+        return [piece.update() for piece, spawned in self.active]
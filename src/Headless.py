@@ -0,0 +1,105 @@
+# File: Headless.py
+# Runs matches with no display, audio or frame limiter for balancing simulations
+
+import argparse
+import os
+import random
+import time
+import Arena
+import Character
+import CombatLog
+
+# 60 seconds of game time at the regular frame rate
+MAX_FRAMES = 60 * Arena.FPS
+
+
+class MatchResult():
+    def __init__(self, winner, frames, playerOneHealth, playerTwoHealth):
+        self.winner = winner
+        self.frames = frames
+        self.playerOneHealth = playerOneHealth
+        self.playerTwoHealth = playerTwoHealth
+
+    @property
+    def timedOut(self):
+        return self.winner == 0
+
+    def asDict(self):
+        return {
+            "winner": self.winner,
+            "frames": self.frames,
+            "playerOneHealth": self.playerOneHealth,
+            "playerTwoHealth": self.playerTwoHealth
+        }
+
+
+def randomPolicy(seed=None, rate=0.2, actions=Character.ACTIONS):
+    """Policy that picks one of actions at random on roughly rate of the frames."""
+    rng = random.Random(seed)
+    actions = tuple(actions)
+
+    def policy(arena, fighter, frame):
+        if rng.random() < rate:
+            return rng.choice(actions)
+        return None
+
+    return policy
+
+
+def runMatch(playerOnePolicy=None, playerTwoPolicy=None, maxFrames=MAX_FRAMES, arena=None):
+    """Play one match as fast as possible and return a MatchResult.
+
+    A policy is called as policy(arena, fighter, frame) once per frame and returns the
+    name of one of the fighter's actions (see Character.ACTIONS) or None to do nothing.
+    """
+    if arena is None:
+        arena = Arena.Arena()
+    playerOne = arena.playerOne
+    playerTwo = arena.playerTwo
+
+    while arena.frame < maxFrames and not arena.isOver():
+        if playerOnePolicy is not None:
+            action = playerOnePolicy(arena, playerOne, arena.frame)
+            if action is not None:
+                arena.act(1, action)
+        if playerTwoPolicy is not None:
+            action = playerTwoPolicy(arena, playerTwo, arena.frame)
+            if action is not None:
+                arena.act(2, action)
+
+        arena.step()
+
+    return MatchResult(arena.winner(), arena.frame,
+                       Arena.limbHealth(playerOne), Arena.limbHealth(playerTwo))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run Block Fight matches without a display")
+    parser.add_argument("--matches", type=int, default=1)
+    parser.add_argument("--frames", type=int, default=MAX_FRAMES, help="frame limit per match")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--log", help="write a combat log per match, named <log>-<match><ext>")
+    parser.add_argument("--log-level", type=int, default=CombatLog.HITS,
+                        help="%d: damaging hits, %d: every contact" % (CombatLog.HITS, CombatLog.CONTACTS))
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    frames = 0
+    for match in range(args.matches):
+        seed = args.seed + match
+        log = None
+        if args.log:
+            base, ext = os.path.splitext(args.log)
+            log = CombatLog.CombatLog("%s-%d%s" % (base, match, ext), args.log_level)
+        result = runMatch(randomPolicy(2 * seed), randomPolicy(2 * seed + 1), args.frames, Arena.Arena(log=log))
+        if log is not None:
+            log.close()
+        frames += result.frames
+        print(match, result.asDict())
+
+    elapsed = time.perf_counter() - start
+    print("%d frames in %.2fs (%.0fx real-time)" % (frames, elapsed, frames / Arena.FPS / max(elapsed, 1e-9)))
+
+
+if __name__ == '__main__':
+    main()
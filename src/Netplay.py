@@ -0,0 +1,473 @@
+# File: Netplay.py
+# Two-player matches over UDP with input prediction and rollback
+
+import argparse
+import heapq
+import multiprocessing
+import random
+import socket
+import struct
+import time
+import pygame
+import Arena
+import Character
+import Headless
+import Snapshot
+
+MAGIC = b"BFNP"
+INPUTS = 0
+SYNC = 1
+# magic, kind, match, player, sender's frame, frames of our inputs it has, its frame advantage,
+# frame of the first input mask that follows
+INPUT_HEADER = struct.Struct("<4sBBBIIbI")
+# magic, kind, match, player, then a packed Snapshot
+SYNC_HEADER = struct.Struct("<4sBBB")
+MAX_INPUTS_PER_PACKET = 255
+
+# Frames a local input waits before it is simulated, so it usually reaches the other side in time
+INPUT_DELAY = 2
+# Frames the simulation may run ahead of the last confirmed remote input before it waits
+MAX_ROLLBACK = 12
+# Player one sends its confirmed state this often, for player two to check its own against
+SYNC_INTERVAL = 10
+# Frames over which a correction from player one's state fades in on screen instead of jumping
+CORRECTION_FRAMES = 8
+# Seconds without a packet before the other side counts as gone, once it has been heard from at all
+TIMEOUT = 5.0
+
+
+def actionMask(actions):
+    """One bit per entry of Character.ACTIONS, so the inputs of a frame fit in a byte."""
+    mask = 0
+    for action in actions:
+        mask |= 1 << Character.ACTIONS.index(action)
+    return mask
+
+
+class UdpLink():
+    """Datagrams to and from one peer, never blocking."""
+    def __init__(self, port, peer):
+        self.peer = peer
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(("", port))
+        self.socket.setblocking(False)
+
+    def send(self, data):
+        try:
+            self.socket.sendto(data, self.peer)
+        except OSError:
+            # The peer isn't listening yet; the next packet repeats everything anyway
+            pass
+
+    def receive(self):
+        packets = []
+        while True:
+            try:
+                packets.append(self.socket.recv(65536))
+            except (BlockingIOError, ConnectionRefusedError):
+                return packets
+
+    def close(self):
+        self.socket.close()
+
+
+class LossyLink():
+    """Wraps a link and drops or holds back what it sends, to try netplay on one machine.
+
+    delay and jitter are one way and in seconds, so the round trip grows by twice delay.
+    """
+    def __init__(self, link, loss=0.0, delay=0.0, jitter=0.0, seed=None):
+        self.link = link
+        self.loss = loss
+        self.delay = delay
+        self.jitter = jitter
+        self.rng = random.Random(seed)
+        self.queue = []
+        self.sent = 0
+        self.dropped = 0
+
+    def send(self, data):
+        self.sent += 1
+        if self.rng.random() < self.loss:
+            self.dropped += 1
+        else:
+            due = time.monotonic() + self.delay + self.rng.uniform(0, self.jitter)
+            heapq.heappush(self.queue, (due, self.sent, data))
+        self.flush()
+
+    def flush(self):
+        now = time.monotonic()
+        while self.queue and self.queue[0][0] <= now:
+            self.link.send(heapq.heappop(self.queue)[2])
+
+    def receive(self):
+        self.flush()
+        return self.link.receive()
+
+    def close(self):
+        self.link.close()
+
+
+class RollbackSession():
+    """Runs one match of an arena against a remote peer playing the other fighter.
+
+    Local inputs are sent every frame, each packet repeating every input the peer hasn't
+    acknowledged yet, so a lost packet costs nothing but time. Frames are simulated
+    without waiting for the remote inputs, predicting that the peer did nothing. When the
+    real inputs turn out different, the arena is restored to the snapshot taken before
+    the first wrong frame and the frames up to now are simulated again.
+
+    Every frame starts from the arena restored to its own snapshot, so a frame simulated again
+    after a rollback starts from the same state as the first time, on either side. Restores
+    still differ by rounding once in a while (see Snapshot.restore), so player one's simulation
+    is the reference: every SYNC_INTERVAL confirmed frames it sends its snapshot and player two
+    rolls back to it if its own state drifted, fading the jump in over CORRECTION_FRAMES frames
+    on screen. Both peers must build their arena the same way. The result of the match is
+    announced with the fighters' victory events once player one's confirmed frames decided it.
+    """
+    def __init__(self, arena, player, link, match=0, inputDelay=INPUT_DELAY, maxRollback=MAX_ROLLBACK,
+                 syncInterval=SYNC_INTERVAL, timeout=TIMEOUT, correctionFrames=CORRECTION_FRAMES):
+        self.arena = arena
+        self.player = player
+        self.remotePlayer = 3 - player
+        self.link = link
+        self.match = match
+        self.maxRollback = maxRollback
+        self.syncInterval = syncInterval
+        self.timeout = timeout
+        self.correctionFrames = correctionFrames
+
+        # Input masks by frame: local ones run inputDelay frames ahead of the simulation and
+        # remote ones only hold the confirmed frames, without gaps
+        self.localInputs = bytearray(inputDelay)
+        self.remoteInputs = bytearray()
+        self.pending = 0
+        # Remote masks the simulation assumed for frames that aren't confirmed yet
+        self.predicted = {}
+        self.snapshots = {}
+        self.keepSnapshots = maxRollback + 2 * syncInterval
+        self.rollbackTo = None
+        self.sync = None
+        self.nextSync = syncInterval
+        # [(fighter, body, dx, dy)] from where player two's bodies were drawn to where a sync put them
+        self.correction = []
+        self.correctionLeft = 0
+
+        self.remoteFrame = 0
+        self.remoteAdvantage = 0
+        self.remoteAck = 0
+        self.waited = False
+        # None until the first packet: the first player to launch waits for the other one as long as it takes
+        self.lastHeard = None
+        self.disconnected = False
+        self.decided = False
+        self.syncedOver = False
+
+        self.rollbacks = 0
+        self.resimulated = 0
+        self.stalls = 0
+        self.desyncs = 0
+        self.maxDrift = 0.0
+        # Packets dropped for being cut short, of an unknown kind or for a different arena
+        self.badPackets = 0
+
+        # A predicted frame may defeat a fighter that the real inputs save, so the
+        # session posts the victory events itself
+        self.victorEvents = [fighter.victorEvent for fighter in arena.fighters]
+        for fighter in arena.fighters:
+            fighter.victorEvent = None
+
+    @property
+    def confirmedFrame(self):
+        """Frames whose inputs from both players are known."""
+        return len(self.remoteInputs)
+
+    def press(self, action):
+        """Queue one of Character.ACTIONS for the local fighter."""
+        self.pending |= 1 << Character.ACTIONS.index(action)
+
+    def act(self, player, action):
+        """Same as Arena.act for the game loop: the keys of either player move the local fighter."""
+        self.press(action)
+
+    def advance(self, elapsed):
+        """Run the frames due after elapsed seconds of real time, like Arena.advance."""
+        for x in range(self.arena.stepper.framesDue(elapsed)):
+            self.tick()
+
+    def tick(self):
+        """One frame of the game: read packets, fix mispredictions, simulate, send. Returns False while waiting."""
+        self.poll()
+        arena = self.arena
+        stepped = False
+        if arena.frame - self.confirmedFrame >= self.maxRollback:
+            # Too far ahead of what the peer has sent to roll back safely
+            self.stalls += 1
+        elif arena.frame - self.remoteFrame - self.remoteAdvantage >= 2 and not self.waited:
+            # The peer is running behind; wait a frame so neither side keeps rolling back
+            self.waited = True
+            self.stalls += 1
+        else:
+            self.waited = False
+            self.localInputs.append(self.pending)
+            self.pending = 0
+            self.simulate()
+            stepped = True
+        self.fadeCorrection()
+        self.checkOutcome()
+        self.send()
+        return stepped
+
+    def idle(self):
+        """Keep talking to the peer without simulating, e.g. after the last frame of a test run."""
+        self.poll()
+        self.checkOutcome()
+        self.send()
+
+    def poll(self):
+        for packet in self.link.receive():
+            self.receive(packet)
+        if self.lastHeard is not None and time.monotonic() - self.lastHeard > self.timeout:
+            self.disconnected = True
+
+        if self.rollbackTo is not None:
+            self.rollback(self.rollbackTo)
+            self.rollbackTo = None
+        if self.sync is not None:
+            self.applySync()
+
+        if self.player == 1:
+            while self.nextSync < self.arena.frame and self.nextSync <= self.confirmedFrame:
+                if self.nextSync in self.snapshots:
+                    self.link.send(SYNC_HEADER.pack(MAGIC, SYNC, self.match, self.player)
+                                   + Snapshot.pack(self.snapshots[self.nextSync]))
+                self.nextSync += self.syncInterval
+
+    def receive(self, packet):
+        """Take in one packet from the link; anything too short or that doesn't fit this match is dropped."""
+        if len(packet) < SYNC_HEADER.size:
+            self.badPackets += 1
+            return
+        magic, kind, match, player = SYNC_HEADER.unpack_from(packet)
+        if magic != MAGIC or match != self.match or player != self.remotePlayer:
+            return
+        if kind == SYNC:
+            try:
+                sync = Snapshot.unpack(packet[SYNC_HEADER.size:])
+            except ValueError:
+                sync = None
+            if sync is None or not Snapshot.fits(sync, self.arena):
+                self.badPackets += 1
+                return
+            self.lastHeard = time.monotonic()
+            if self.sync is None or sync.frame > self.sync.frame:
+                self.sync = sync
+            return
+        if kind != INPUTS or len(packet) < INPUT_HEADER.size:
+            self.badPackets += 1
+            return
+        self.lastHeard = time.monotonic()
+
+        magic, kind, match, player, frame, ack, advantage, first = INPUT_HEADER.unpack_from(packet)
+        self.remoteFrame = max(self.remoteFrame, frame)
+        self.remoteAdvantage = advantage
+        self.remoteAck = max(self.remoteAck, ack)
+        start = self.confirmedFrame - first
+        if start < 0:
+            # Packets only start at frames we have acknowledged, so this one is out of date
+            return
+        for mask in packet[INPUT_HEADER.size + start:]:
+            frame = self.confirmedFrame
+            self.remoteInputs.append(mask)
+            if frame in self.predicted and self.predicted.pop(frame) != mask and self.rollbackTo is None:
+                self.rollbackTo = frame
+
+    def applySync(self):
+        """Take player one's state for a frame both sides have confirmed, if ours went astray."""
+        sync = self.sync
+        if sync.frame >= self.arena.frame or sync.frame > self.confirmedFrame:
+            return
+        self.sync = None
+        if any(sync.defeated):
+            self.syncedOver = True
+        ours = self.snapshots.get(sync.frame)
+        if ours is None or ours == sync:
+            return
+        self.desyncs += 1
+        self.maxDrift = max(self.maxDrift, positionDrift(ours, sync))
+        self.snapshots[sync.frame] = sync
+        # Where the bodies are drawn now, including what is left of an earlier correction
+        before = []
+        for fighter in self.arena.fighters:
+            for body in fighter.movingBodies:
+                position = body.position
+                dx, dy = fighter.drawOffsets.get(body, (0.0, 0.0))
+                before.append((fighter, body, position.x + dx, position.y + dy))
+        self.rollback(sync.frame)
+        self.correction = [(fighter, body, x - body.position.x, y - body.position.y) for fighter, body, x, y in before]
+        self.correctionLeft = self.correctionFrames
+
+    def fadeCorrection(self):
+        """Draw the fighters a shrinking part of the last correction away from where they are."""
+        if not self.correction:
+            return
+        share = self.correctionLeft / float(self.correctionFrames)
+        for fighter, body, dx, dy in self.correction:
+            if share > 0:
+                fighter.drawOffsets[body] = (dx * share, dy * share)
+            else:
+                fighter.drawOffsets.pop(body, None)
+        if share > 0:
+            self.correctionLeft -= 1
+        else:
+            self.correction = []
+
+    def rollback(self, frame):
+        arena = self.arena
+        current = arena.frame
+        arena.restore(self.snapshots[frame])
+        self.rollbacks += 1
+        while arena.frame < current:
+            self.simulate()
+            self.resimulated += 1
+
+    def simulate(self):
+        """Step the arena one frame with the best inputs known for it."""
+        arena = self.arena
+        frame = arena.frame
+        snapshot = arena.snapshot()
+        self.snapshots[frame] = snapshot
+        self.snapshots.pop(frame - self.keepSnapshots, None)
+        # Chipmunk carries contacts and solver impulses from one frame to the next that a snapshot
+        # can't hold; dropping them every frame keeps a resimulated frame the same as the first run
+        arena.restore(snapshot)
+
+        if frame < self.confirmedFrame:
+            remote = self.remoteInputs[frame]
+        else:
+            remote = 0
+            self.predicted[frame] = remote
+        masks = {self.player: self.localInputs[frame], self.remotePlayer: remote}
+        # Same order on both sides, player one first
+        for player in (1, 2):
+            mask = masks[player]
+            if mask:
+                for index, action in enumerate(Character.ACTIONS):
+                    if mask & (1 << index):
+                        arena.act(player, action)
+        arena.step()
+
+    def checkOutcome(self):
+        """Announce the winner once player one's simulation has decided the match for both sides."""
+        arena = self.arena
+        if self.player == 1:
+            final = arena.frame <= self.confirmedFrame
+        else:
+            final = self.syncedOver
+        if not self.decided and arena.isOver() and final:
+            self.decided = True
+            winner = arena.winner()
+            if winner and arena.screen is not None:
+                pygame.event.post(pygame.event.Event(self.victorEvents[2 - winner], {}))
+
+    def send(self):
+        first = self.remoteAck
+        masks = bytes(self.localInputs[first:first + MAX_INPUTS_PER_PACKET])
+        advantage = max(-127, min(127, self.arena.frame - self.remoteFrame))
+        self.link.send(INPUT_HEADER.pack(MAGIC, INPUTS, self.match, self.player, self.arena.frame,
+                                         self.confirmedFrame, advantage, first) + masks)
+
+    def stats(self):
+        return {"frames": self.arena.frame, "confirmed": self.confirmedFrame, "rollbacks": self.rollbacks,
+                "resimulated": self.resimulated, "stalls": self.stalls, "desyncs": self.desyncs,
+                "maxDrift": self.maxDrift, "badPackets": self.badPackets}
+
+
+def positionDrift(snapshot, other):
+    """Largest distance along x or y between the same body in two snapshots."""
+    a = snapshot.bodies
+    b = other.bodies
+    fields = len(Snapshot.BODY_FIELDS)
+    return max(max(abs(a[i] - b[i]), abs(a[i + 1] - b[i + 1])) for i in range(0, len(a), fields))
+
+
+def parsePeer(peer):
+    host, port = peer.rsplit(":", 1)
+    return host, int(port)
+
+
+def runPeer(player, port, peer, frames=500, seed=None, loss=0.0, delay=0.0, jitter=0.0, fps=Arena.FPS):
+    """Play frames frames headless against a peer with random inputs, in real time.
+
+    Returns the session's stats plus the final state, packed, for comparing the two sides.
+    """
+    arena = Arena.Arena()
+    link = LossyLink(UdpLink(port, peer), loss, delay, jitter, seed)
+    session = RollbackSession(arena, player, link)
+    policy = Headless.randomPolicy(seed)
+    fighter = arena.fighters[player - 1]
+
+    nextTick = time.perf_counter()
+    while not session.disconnected and (arena.frame < frames or session.confirmedFrame < frames):
+        if arena.frame < frames:
+            action = policy(arena, fighter, arena.frame)
+            if action is not None:
+                session.press(action)
+            session.tick()
+        else:
+            session.idle()
+        nextTick += 1.0 / fps
+        time.sleep(max(0.0, nextTick - time.perf_counter()))
+
+    # Let the peer hear our last inputs before going away
+    for x in range(fps):
+        session.idle()
+        time.sleep(1.0 / fps)
+    link.close()
+
+    stats = session.stats()
+    stats.update({"player": player, "sent": link.sent, "dropped": link.dropped,
+                  "winner": arena.winner(), "state": Snapshot.pack(arena.snapshot())})
+    return stats
+
+
+def loopback(frames, seed, loss, delay, jitter, basePort=47001):
+    """Play both sides in two local processes over the loopback interface and compare them."""
+    ports = (basePort, basePort + 1)
+    with multiprocessing.Pool(2) as pool:
+        jobs = [pool.apply_async(runPeer, (player, ports[player - 1], ("127.0.0.1", ports[2 - player]), frames,
+                                           None if seed is None else seed + player, loss, delay, jitter))
+                for player in (1, 2)]
+        results = [job.get() for job in jobs]
+
+    states = [Snapshot.unpack(result.pop("state")) for result in results]
+    for result in results:
+        print(result)
+    print("final frame", states[0].frame, states[1].frame, "largest difference in position",
+          positionDrift(states[0], states[1]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless Block Fight netplay between two peers")
+    parser.add_argument("--loopback", action="store_true", help="run both peers locally and compare them")
+    parser.add_argument("--player", type=int, choices=(1, 2), default=1)
+    parser.add_argument("--port", type=int, default=47001)
+    parser.add_argument("--peer", default="127.0.0.1:47002", help="host:port of the other player")
+    parser.add_argument("--frames", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--loss", type=float, default=0.0, help="fraction of sent packets dropped")
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds added to every sent packet")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many more seconds of delay")
+    args = parser.parse_args()
+
+    if args.loopback:
+        loopback(args.frames, args.seed, args.loss, args.delay, args.jitter, args.port)
+    else:
+        result = runPeer(args.player, args.port, parsePeer(args.peer), args.frames, args.seed,
+                         args.loss, args.delay, args.jitter)
+        result.pop("state")
+        print(result)
+
+
+if __name__ == '__main__':
+    main()
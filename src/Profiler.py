@@ -0,0 +1,193 @@
+# File: Profiler.py
+# Times each phase of the game loop over a rolling window of frames
+
+import collections
+import csv
+import json
+import time
+import Assets
+
+# Phases of one pass of the game loop, in the order they run
+PHASES = ("events", "sprites", "joints", "capture", "overlay", "physics", "present", "wait")
+# Frames kept for the statistics, 10 seconds at the regular frame rate
+WINDOW = 500
+# Histogram bins in milliseconds; the last bin also counts everything slower
+BIN_WIDTH = 0.5
+BINS = 80
+# Frames between refreshes of the overlay text, so it is readable and cheap
+OVERLAY_REFRESH = 25
+# Seconds from launch to the first frame on screen that startup should stay within
+STARTUP_BUDGET = 1.0
+
+
+class RollingHistogram():
+    """Histogram of the last window samples, kept up to date as samples come and go."""
+    def __init__(self, window=WINDOW, binWidth=BIN_WIDTH, bins=BINS):
+        self.samples = collections.deque(maxlen=window)
+        self.binWidth = binWidth
+        self.counts = [0] * bins
+        self.total = 0.0
+
+    def binOf(self, value):
+        return min(len(self.counts) - 1, int(value / self.binWidth))
+
+    def add(self, value):
+        if len(self.samples) == self.samples.maxlen:
+            old = self.samples[0]
+            self.counts[self.binOf(old)] -= 1
+            self.total -= old
+        self.samples.append(value)
+        self.counts[self.binOf(value)] += 1
+        self.total += value
+
+    def mean(self):
+        return self.total / len(self.samples) if self.samples else 0.0
+
+    def percentile(self, fraction):
+        """Upper edge of the bin holding the given fraction of the samples."""
+        needed = fraction * len(self.samples)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= needed:
+                return (index + 1) * self.binWidth
+        return 0.0
+
+    def summary(self):
+        return {"mean": self.mean(), "p50": self.percentile(0.5), "p95": self.percentile(0.95),
+                "max": max(self.samples) if self.samples else 0.0, "histogram": list(self.counts)}
+
+
+class Profiler():
+    """Splits every frame into phases with mark(), in milliseconds.
+
+    Call startFrame() at the top of the loop, mark(phase) at the end of each phase and
+    endFrame() last. Collision callbacks and substeps per frame are read from the arena.
+    """
+    def __init__(self, phases=PHASES, window=WINDOW):
+        self.phases = phases
+        self.histograms = {phase: RollingHistogram(window) for phase in phases + ("frame",)}
+        self.rows = collections.deque(maxlen=window)
+        self.current = {}
+        self.frames = 0
+        self.contacts = None
+        self.arena = None
+        self.lastMark = self.frameStart = time.perf_counter()
+
+        self.overlayVisible = False
+        self.overlayLines = []
+        # Other figures shown on the overlay, by label, set by whoever measures them
+        self.counters = {}
+
+    def watch(self, arena):
+        """Count collision callbacks and substeps of arena from the next frame on."""
+        self.arena = arena
+        self.contacts = arena.collisions.contacts
+
+    def startFrame(self):
+        self.current = {}
+        self.lastMark = self.frameStart = time.perf_counter()
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.current[phase] = self.current.get(phase, 0.0) + (now - self.lastMark) * 1000.0
+        self.lastMark = now
+
+    def endFrame(self):
+        row = {"frame": self.frames}
+        for phase in self.phases:
+            duration = self.current.get(phase, 0.0)
+            self.histograms[phase].add(duration)
+            row[phase] = duration
+        total = (self.lastMark - self.frameStart) * 1000.0
+        self.histograms["frame"].add(total)
+        row["total"] = total
+
+        if self.arena is not None:
+            contacts = self.arena.collisions.contacts
+            row["contacts"] = contacts - self.contacts
+            row["substeps"] = self.arena.stepper.substeps
+            self.contacts = contacts
+        self.rows.append(row)
+        self.frames += 1
+
+    def toggleOverlay(self):
+        self.overlayVisible = not self.overlayVisible
+        self.overlayLines = []
+
+    def drawOverlay(self, screen, color=(0, 0, 0), size=18):
+        """Draw mean and 95th percentile of each phase in the top left; returns the rects covered."""
+        if not self.overlayVisible:
+            return []
+        if not self.overlayLines or self.frames % OVERLAY_REFRESH == 0:
+            lines = []
+            for phase in self.phases + ("frame",):
+                histogram = self.histograms[phase]
+                lines.append("%-8s %6.2f ms  p95 %6.2f" % (phase, histogram.mean(), histogram.percentile(0.95)))
+            if self.rows and "contacts" in self.rows[-1]:
+                contacts = sum(row["contacts"] for row in self.rows) / float(len(self.rows))
+                substeps = sum(row["substeps"] for row in self.rows) / float(len(self.rows))
+                lines.append("contacts %6.1f  substeps %4.1f" % (contacts, substeps))
+            for label, value in sorted(self.counters.items()):
+                lines.append("%s %g" % (label, value))
+            self.overlayLines = lines
+
+        drawn = []
+        y = 5
+        for line in self.overlayLines:
+            surface = Assets.text(line, color, size, Assets.MONOSPACE)
+            drawn.append(screen.blit(surface, (5, y)))
+            y += surface.get_height()
+        return drawn
+
+    def summary(self):
+        return {phase: histogram.summary() for phase, histogram in self.histograms.items()}
+
+    def export(self, path):
+        """Write the frames in the window as CSV, or the summary with histograms as JSON for a .json path."""
+        if path.endswith(".json"):
+            with open(path, "w") as summaryFile:
+                json.dump({"frames": self.frames, "binWidth": BIN_WIDTH, "phases": self.summary()}, summaryFile,
+                          indent=2)
+            return
+        with open(path, "w", newline="") as rowsFile:
+            fields = ["frame"] + list(self.phases) + ["total", "contacts", "substeps"]
+            writer = csv.DictWriter(rowsFile, fields, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(self.rows)
+
+
+class StartupTimer():
+    """Seconds each stage of startup took, from started, a time.perf_counter() value, on.
+
+    Call stage(name) at the end of each stage. Work done on other threads is added with
+    background(name, seconds) whenever it finishes, and shows as pending until then.
+    """
+    def __init__(self, started=None, budget=STARTUP_BUDGET, pending=()):
+        self.started = time.perf_counter() if started is None else started
+        self.budget = budget
+        self.lastMark = self.started
+        self.stages = []
+        self.backgroundStages = {name: None for name in pending}
+
+    def stage(self, name):
+        now = time.perf_counter()
+        self.stages.append((name, now - self.lastMark))
+        self.lastMark = now
+
+    def background(self, name, seconds):
+        self.backgroundStages[name] = seconds
+
+    def total(self):
+        return self.lastMark - self.started
+
+    def report(self):
+        lines = ["%-20s %7.1f ms" % (name, seconds * 1000.0) for name, seconds in self.stages]
+        total = self.total()
+        lines.append("%-20s %7.1f ms%s" % ("total", total * 1000.0,
+                                           "  over the %.0f ms budget" % (self.budget * 1000.0)
+                                           if total > self.budget else ""))
+        for name, seconds in sorted(self.backgroundStages.items()):
+            lines.append("%-20s %s" % (name + " (background)",
+                                       "pending" if seconds is None else "%7.1f ms" % (seconds * 1000.0)))
+        return "\n".join(lines)
@@ -0,0 +1,63 @@
+# File: Renderer.py
+# Dirty rectangle rendering: only the parts of the screen that changed are redrawn and pushed
+
+import pygame
+
+# Above this fraction of the screen changing it is cheaper to flip the whole display
+MAX_DIRTY_FRACTION = 0.4
+
+
+class Renderer():
+    """Tracks what was drawn each frame, the way pygame's RenderUpdates group does for sprites.
+
+    Each frame call clear() to paint the background back over last frame's drawings, draw
+    everything and add() the rect of each drawing, then present() to push only the
+    rectangles that changed. When they cover too much of the screen it flips instead.
+    """
+    def __init__(self, screen, color, maxDirtyFraction=MAX_DIRTY_FRACTION):
+        self.screen = screen
+        self.background = pygame.Surface(screen.get_size()).convert()
+        self.background.fill(color)
+        self.maxDirtyArea = maxDirtyFraction * screen.get_width() * screen.get_height()
+        self.previous = []
+        self.drawn = []
+        self.fullRedraw = True
+        self.flips = 0
+        self.updates = 0
+
+    def invalidate(self):
+        """Redraw and push the whole screen on the next frame."""
+        self.fullRedraw = True
+
+    def clear(self):
+        if self.fullRedraw:
+            self.screen.blit(self.background, (0, 0))
+        else:
+            for rect in self.previous:
+                self.screen.blit(self.background, rect, rect)
+        self.drawn = []
+
+    def add(self, rect):
+        if rect is not None:
+            self.drawn.append(rect)
+
+    def addAll(self, rects):
+        for rect in rects:
+            if rect is not None:
+                self.drawn.append(rect)
+
+    def present(self):
+        dirty = self.previous + self.drawn
+        area = 0
+        for rect in dirty:
+            area += rect.width * rect.height
+
+        if self.fullRedraw or area > self.maxDirtyArea:
+            pygame.display.flip()
+            self.flips += 1
+        else:
+            pygame.display.update(dirty)
+            self.updates += 1
+
+        self.previous = self.drawn
+        self.fullRedraw = False
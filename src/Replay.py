@@ -0,0 +1,97 @@
+# File: Replay.py
+# Records fighter actions by physics frame and plays them back deterministically
+
+import argparse
+import struct
+import Arena
+import Character
+import Headless
+
+MAGIC = b"BFRP"
+VERSION = 2
+# magic, version, arena width, arena height, frame the recording stopped at, number of inputs
+HEADER = struct.Struct("<4sBHHII")
+# frame, player, index into Character.ACTIONS
+INPUT = struct.Struct("<IBB")
+
+
+class InputRecorder():
+    """Collects (frame, player, action) for every action an arena performs.
+
+    Attach it with arena.recorder = recorder; Arena.act calls record().
+    """
+    def __init__(self, size=Arena.ARENA_SIZE):
+        self.size = size
+        self.inputs = []
+
+    def record(self, frame, player, action):
+        self.inputs.append((frame, player, Character.ACTIONS.index(action)))
+
+    def save(self, path, endFrame):
+        """Write the inputs to path, the match having been played up to frame endFrame."""
+        with open(path, "wb") as replayFile:
+            replayFile.write(HEADER.pack(MAGIC, VERSION, self.size[0], self.size[1], endFrame, len(self.inputs)))
+            replayFile.write(b"".join(INPUT.pack(*entry) for entry in self.inputs))
+
+
+def load(path):
+    """Returns (arena size, [(frame, player, action name), ...], end frame) from a replay file."""
+    with open(path, "rb") as replayFile:
+        data = replayFile.read()
+    magic, version, width, height, endFrame, count = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a version %d Block Fight replay: %s" % (VERSION, path))
+    inputs = []
+    for frame, player, action in INPUT.iter_unpack(data[HEADER.size:HEADER.size + count * INPUT.size]):
+        inputs.append((frame, player, Character.ACTIONS[action]))
+    return (width, height), inputs, endFrame
+
+
+class ReplayPlayer():
+    """Feeds recorded inputs back into an arena through the same action methods.
+
+    Attach it with arena.replay = player; Arena.step calls apply() before every frame, and
+    Arena.advance stops at endFrame, where the recording stopped.
+    """
+    def __init__(self, inputs, endFrame):
+        self.inputs = inputs
+        self.endFrame = endFrame
+        self.next = 0
+
+    def apply(self, arena):
+        """Perform every input recorded for the frame the arena is about to step."""
+        while self.next < len(self.inputs) and self.inputs[self.next][0] <= arena.frame:
+            frame, player, action = self.inputs[self.next]
+            arena.act(player, action)
+            self.next += 1
+
+    def ended(self, arena):
+        return arena.frame >= self.endFrame
+
+
+def replayMatch(path, maxFrames=None):
+    """Fast-forward a replay without rendering and return its Headless.MatchResult.
+
+    Stops when the match is decided or where the recording stopped, or earlier at maxFrames.
+    """
+    size, inputs, endFrame = load(path)
+    arena = Arena.Arena(size=size)
+    player = ReplayPlayer(inputs, endFrame)
+    arena.replay = player
+    while not arena.isOver() and not player.ended(arena) and (maxFrames is None or arena.frame < maxFrames):
+        arena.step()
+
+    return Headless.MatchResult(arena.winner(), arena.frame,
+                                Arena.limbHealth(arena.playerOne), Arena.limbHealth(arena.playerTwo))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fast-forward a Block Fight replay without a display")
+    parser.add_argument("replay")
+    parser.add_argument("--frames", type=int, help="frame limit, by default where the recording stopped")
+    args = parser.parse_args()
+    print(replayMatch(args.replay, args.frames).asDict())
+
+
+if __name__ == '__main__':
+    main()
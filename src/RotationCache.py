@@ -0,0 +1,71 @@
+# File: RotationCache.py
+# Shared cache of pre-rotated sprite images so sprites stop calling transform.rotate every frame
+
+from collections import OrderedDict
+import pygame
+
+DEFAULT_STEP = 2  # degrees
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+
+class RotationCache():
+    """Rotated copies of images keyed by image and angle quantized to step degrees.
+
+    Entries are evicted least recently used first once their pixel data goes over maxBytes.
+    """
+    def __init__(self, step=DEFAULT_STEP, maxBytes=DEFAULT_MAX_BYTES):
+        self.step = step
+        self.maxBytes = maxBytes
+        self.entries = OrderedDict()
+        self.bytesUsed = 0
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, step=None, maxBytes=None):
+        if step is not None and step != self.step:
+            self.step = step
+            self.clear()
+        if maxBytes is not None:
+            self.maxBytes = maxBytes
+            self.evict()
+
+    def clear(self):
+        self.entries.clear()
+        self.bytesUsed = 0
+
+    def get(self, key, image, angleDegrees):
+        """Returns (surface, halfWidth, halfHeight) for image rotated by angleDegrees.
+
+        key identifies the image, so every sprite that uses the same image file shares entries.
+        """
+        steps = int(round(360.0 / self.step))
+        index = int(round(angleDegrees / self.step)) % steps
+        entryKey = (key, index)
+        entry = self.entries.get(entryKey)
+        if entry is not None:
+            self.hits += 1
+            self.entries.move_to_end(entryKey)
+            return entry
+
+        self.misses += 1
+        surface = pygame.transform.rotate(image, index * self.step)
+        width, height = surface.get_size()
+        entry = (surface, width / 2., height / 2.)
+        self.entries[entryKey] = entry
+        self.bytesUsed += width * height * surface.get_bytesize()
+        self.evict()
+        return entry
+
+    def evict(self):
+        # Always keep the newest entry, even if it alone is over the limit
+        while self.bytesUsed > self.maxBytes and len(self.entries) > 1:
+            (key, index), (surface, halfWidth, halfHeight) = self.entries.popitem(last=False)
+            self.bytesUsed -= surface.get_width() * surface.get_height() * surface.get_bytesize()
+
+
+# Cache shared by every PymunkSprite
+rotationCache = RotationCache()
+
+
+def configure(step=None, maxBytes=None):
+    rotationCache.configure(step, maxBytes)
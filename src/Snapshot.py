@@ -0,0 +1,181 @@
+# File: Snapshot.py
+# Captures the state of an arena into flat arrays and puts it back, for rollback and search
+
+import struct
+import pymunk as pm
+from array import array
+
+# Values kept for every body, in this order
+BODY_FIELDS = ("x", "y", "angle", "vx", "vy", "angularVelocity")
+# frame, number of body values, health values, limbs and fighters, then the stepper's substeps,
+# solver iterations and whether it measures again, before the data of pack()
+HEADER = struct.Struct("<IHHBBBBB")
+
+
+class Snapshot():
+    """The state of an arena at the start of a frame.
+
+    bodies holds BODY_FIELDS for every body of both fighters, health the health of every
+    shape that has one and limbs one byte per limb, 1 while it is attached. stepper is the
+    substep count, iterations and due flag the stepper carries into the next frame. Nothing in it
+    refers to pymunk objects, so it is cheap to keep many and to copy between processes.
+    """
+    def __init__(self, frame, bodies, health, limbs, defeated, stepper=(0, 0, 1)):
+        self.frame = frame
+        self.bodies = bodies
+        self.health = health
+        self.limbs = limbs
+        self.defeated = defeated
+        self.stepper = stepper
+
+    def __eq__(self, other):
+        return (isinstance(other, Snapshot) and self.frame == other.frame and self.bodies == other.bodies
+                and self.health == other.health and self.limbs == other.limbs and self.defeated == other.defeated
+                and self.stepper == other.stepper)
+
+    def __ne__(self, other):
+        return not self == other
+
+
+def pack(snapshot):
+    """snapshot as bytes, small enough for a single datagram. Floats keep the machine's byte order."""
+    return (HEADER.pack(snapshot.frame, len(snapshot.bodies), len(snapshot.health), len(snapshot.limbs),
+                        len(snapshot.defeated), *snapshot.stepper)
+            + snapshot.bodies.tobytes() + snapshot.health.tobytes() + snapshot.limbs + snapshot.defeated)
+
+
+def unpack(data):
+    """The Snapshot packed into data; raises ValueError if data is shorter or longer than its header says."""
+    if len(data) < HEADER.size:
+        raise ValueError("Snapshot needs %d bytes of header, got %d" % (HEADER.size, len(data)))
+    frame, bodyCount, healthCount, limbCount, fighterCount, substeps, iterations, due = HEADER.unpack_from(data)
+    bodies = array("d")
+    health = array("d")
+    size = HEADER.size + (bodyCount + healthCount) * bodies.itemsize + limbCount + fighterCount
+    if len(data) != size:
+        raise ValueError("Snapshot of %d bytes, its header says %d" % (len(data), size))
+    offset = HEADER.size
+    bodies.frombytes(data[offset:offset + bodyCount * bodies.itemsize])
+    offset += bodyCount * bodies.itemsize
+    health.frombytes(data[offset:offset + healthCount * health.itemsize])
+    offset += healthCount * health.itemsize
+    limbs = bytes(data[offset:offset + limbCount])
+    defeated = bytes(data[offset + limbCount:offset + limbCount + fighterCount])
+    return Snapshot(frame, bodies, health, limbs, defeated, (substeps, iterations, due))
+
+
+def fits(snapshot, arena):
+    """Whether snapshot has as many bodies, health values, limbs and fighters as arena, so it can be restored there."""
+    fighters = arena.fighters
+    return (len(snapshot.bodies) == len(BODY_FIELDS) * sum(len(fighter.movingBodies) for fighter in fighters)
+            and len(snapshot.health) == sum(len(fighter.healthShapes) for fighter in fighters)
+            and len(snapshot.limbs) == sum(len(fighter.limbs) for fighter in fighters)
+            and len(snapshot.defeated) == len(fighters))
+
+
+def take(arena):
+    """Snapshot arena between frames."""
+    values = []
+    append = values.extend
+    health = []
+    limbs = []
+    defeated = []
+    for fighter in arena.fighters:
+        for body in fighter.movingBodies:
+            position = body.position
+            velocity = body.velocity
+            append((position.x, position.y, body.angle, velocity.x, velocity.y, body.angular_velocity))
+        health.extend(shape.health for shape in fighter.healthShapes)
+        limbs.append(fighter.limbFlags())
+        defeated.append(fighter.defeated)
+    stepper = arena.stepper
+    return Snapshot(arena.frame, array("d", values), array("d", health), b"".join(limbs), bytes(defeated),
+                    (stepper.substeps, arena.space.iterations, int(stepper.due)))
+
+
+def flushSolver(space, fighters, dt, keepJoints=False):
+    """Empty what chipmunk carries from one step to the next for fighters and take their shapes out of space.
+
+    Bodies keep a bias velocity from the last contacts that moves them in the next step, and
+    joints start the next step from the impulse they pushed with last. One step of dt seconds
+    of the bare skeletons, without shapes and with the joints allowed no force, uses up the
+    first and zeroes the second. Positions and velocities come out wrong and have to be set.
+    Unless keepJoints, the bodies and joints leave the space as well.
+    """
+    joints = []
+    for fighter in fighters:
+        lost = fighter.lostMembers()
+        space.remove(*[part.shape for part in fighter.parts if part.shape not in lost])
+        if not keepJoints:
+            space.add(*[item for item in fighter.members if item in lost and not isinstance(item, pm.Shape)])
+            joints.extend(fighter.joints)
+        else:
+            joints.extend(joint for joint in fighter.joints if joint not in lost)
+    forces = [joint.max_force for joint in joints]
+    for joint in joints:
+        joint.max_force = 0
+    space.step(dt)
+    for joint, force in zip(joints, forces):
+        joint.max_force = force
+    if not keepJoints:
+        space.remove(*joints)
+        space.remove(*[body for fighter in fighters for body in fighter.movingBodies])
+
+
+def restore(arena, snapshot):
+    """Put arena back in the state snapshot was taken in.
+
+    The snapshot must come from an arena with the same skeletons. The fighters' shapes leave
+    the space, the solver's leftovers are flushed and the shapes come back in the order they
+    were built, already in their snapshot poses, so no contacts, joint impulses or sleep timers
+    carry over. Bodies and joints stay unless a limb changed since they were last added, then
+    they are added again in build order too, since chipmunk solves joints in the order it got
+    them. Restoring the same snapshot twice and playing the same inputs gives the same frames,
+    except that chipmunk's broad phase visits shapes in an order that follows the ids it gave
+    them, which Python can't reset; a contact then comes out a rounding error apart.
+    """
+    arena.collisions.reset()
+    # Debris from limbs that came off after the snapshot goes away; older pieces keep falling
+    arena.debris.clear(snapshot.frame)
+    stepper = arena.stepper
+    substeps, iterations, due = snapshot.stepper
+    fighterLimbs = []
+    limbIndex = 0
+    for fighter in arena.fighters:
+        count = len(fighter.limbs)
+        fighterLimbs.append(snapshot.limbs[limbIndex:limbIndex + count])
+        limbIndex += count
+    keepJoints = all(fighter.attachedLimbs == fighter.limbFlags() == limbs
+                     for fighter, limbs in zip(arena.fighters, fighterLimbs))
+    flushSolver(arena.space, arena.fighters, stepper.frameTime / (substeps or stepper.minSubsteps), keepJoints)
+
+    bodies = snapshot.bodies
+    health = snapshot.health
+    fields = len(BODY_FIELDS)
+    index = 0
+    healthIndex = 0
+    for side, fighter in enumerate(arena.fighters):
+        fighter.restoreLimbs(fighterLimbs[side])
+        for body in fighter.movingBodies:
+            body.position = bodies[index], bodies[index + 1]
+            body.angle = bodies[index + 2]
+            body.velocity = bodies[index + 3], bodies[index + 4]
+            body.angular_velocity = bodies[index + 5]
+            index += fields
+
+        for shape in fighter.healthShapes:
+            shape.health = health[healthIndex]
+            healthIndex += 1
+        fighter.defeated = bool(snapshot.defeated[side])
+
+    for fighter in arena.fighters:
+        if keepJoints:
+            lost = fighter.lostMembers()
+            arena.space.add(*[part.shape for part in fighter.parts if part.shape not in lost])
+        else:
+            fighter.attach()
+
+    stepper.frame = snapshot.frame
+    stepper.substeps = substeps
+    stepper.due = bool(due)
+    arena.space.iterations = iterations
@@ -0,0 +1,61 @@
+# File: StateTable.py
+# Fighter state of an arena in one NumPy array, refreshed once per frame
+
+import numpy as np
+import Character
+
+# Values of every part, in this order along the last axis
+FIELDS = ("x", "y", "angle", "vx", "vy", "health", "alive")
+PART_NAMES = tuple(part[0] for part in Character.SKELETON["parts"])
+# Index of each part along the second axis
+PART_INDEX = {name: index for index, name in enumerate(PART_NAMES)}
+
+
+class StateTable():
+    """Every part of both fighters in a (2, parts, fields) float array, see FIELDS and PART_INDEX.
+
+    refresh() fills it in one pass; Arena.stateTable() creates the table and the arena
+    refreshes it after every step, reset and restore. position, angle, velocity, health and
+    alive are views of data, so readers share it without copying. Parts without health read 0
+    and alive is 0 once a part's limb came off. Pass out to fill part of a bigger array.
+    """
+    def __init__(self, arena, out=None):
+        self.arena = arena
+        shape = (len(arena.fighters), len(PART_NAMES), len(FIELDS))
+        self.data = np.zeros(shape) if out is None else out
+        if self.data.shape != shape or not self.data.flags.c_contiguous:
+            raise ValueError("State table needs a contiguous array of shape %s" % (shape,))
+        self.flat = self.data.reshape(-1)
+        self.position = self.data[..., 0:2]
+        self.angle = self.data[..., 2]
+        self.velocity = self.data[..., 3:5]
+        self.health = self.data[..., 5]
+        self.alive = self.data[..., 6]
+
+        # Per fighter: (body, health shape or None, limb alive flag or None) for every part
+        self.sources = []
+        for fighter in arena.fighters:
+            limbOf = {}
+            for aliveFlag, healthPart, limbParts, removed in fighter.limbs:
+                for part in limbParts:
+                    limbOf[part] = aliveFlag
+            parts = [getattr(fighter, name) for name in PART_NAMES]
+            self.sources.append((fighter, [(part.shape.body, part.shape if hasattr(part.shape, "health") else None,
+                                            limbOf.get(part)) for part in parts]))
+        self.refresh()
+
+    def refresh(self):
+        values = []
+        append = values.extend
+        for fighter, parts in self.sources:
+            for body, healthShape, aliveFlag in parts:
+                position = body.position
+                velocity = body.velocity
+                append((position.x, position.y, body.angle, velocity.x, velocity.y,
+                        0 if healthShape is None else healthShape.health,
+                        1 if aliveFlag is None or getattr(fighter, aliveFlag) else 0))
+        self.flat[:] = values
+
+    def part(self, side, name):
+        """Row of FIELDS for one part; side is 0 for player one and 1 for player two."""
+        return self.data[side, PART_INDEX[name]]
@@ -0,0 +1,159 @@
+# File: Stepper.py
+# Fixed timestep physics scheduler that picks how many substeps each frame needs
+
+import math
+import pymunk as pm
+
+# Distance in pixels a body may travel in one substep before we split the frame further.
+# The smallest block is 40 pixels wide, so a fifth of it keeps fast fists from tunneling through joints.
+MAX_TRAVEL = 8.0
+# Rough distance from a block's center to its corner, used to turn spin into travel
+BLOCK_RADIUS = 35.0
+# Pin joint stretch in pixels above which the solver gets extra help. In random matches pins stretch
+# about 11 pixels on a typical frame and 18 on one frame in twenty, so only stretch beyond what
+# fighting normally causes pays for more iterations and substeps.
+MAX_JOINT_ERROR = 20.0
+# Frames a substep count is kept before it is measured again, unless a fighter acts sooner
+RECHECK_FRAMES = 4
+
+
+class Stepper():
+    """Runs a space in fixed frames of frameTime seconds, each split into 1 to maxSubsteps substeps.
+
+    The substep count follows the fastest body and the worst pin joint error, and
+    space.iterations is raised while joints are stretched. The count is measured every
+    RECHECK_FRAMES frames, and on the next frame after disturb().
+    """
+    def __init__(self, space, frameTime, minSubsteps=3, maxSubsteps=25, iterations=5, errorIterations=10,
+                 maxFramesPerAdvance=5, fighters=()):
+        self.space = space
+        # With fighters only their attached parts and pins are measured, see fighterMotion
+        self.fighters = fighters
+        self.frameTime = frameTime
+        self.minSubsteps = minSubsteps
+        self.maxSubsteps = maxSubsteps
+        self.iterations = iterations
+        self.errorIterations = errorIterations
+        self.maxFramesPerAdvance = maxFramesPerAdvance
+        self.accumulator = 0.0
+        # Index of the frame being stepped and of the substep within it
+        self.frame = 0
+        self.substep = 0
+        self.substeps = 0
+        # Measure the substeps before the next frame instead of keeping the last count
+        self.due = True
+        # Bodies allowed to tunnel, like debris, so they don't drive up the substeps
+        self.ignored = set()
+        space.iterations = iterations
+
+    def reset(self):
+        self.accumulator = 0.0
+        self.frame = 0
+        self.substep = 0
+        self.substeps = 0
+        self.due = True
+        self.space.iterations = self.iterations
+
+    def disturb(self):
+        """Measure the substeps again before the next frame, for when something was just set moving."""
+        self.due = True
+
+    def fighterMotion(self):
+        """(fastest speed, worst pin stretch) over the parts and pins still attached to the fighters.
+
+        Goes through each fighter's pin chains, which lose their joints as limbs break off, so
+        debris and severed parts are left out. Every body is read once and the pin anchors are
+        placed from those readings instead of asking chipmunk for them.
+        """
+        fastest = 0.0
+        worst = 0.0
+        for fighter in self.fighters:
+            poses = {}
+            for joints, points in fighter.jointChains:
+                previous = None
+                for index, (body, x, y) in enumerate(points):
+                    pose = poses.get(body)
+                    if pose is None:
+                        position = body.position
+                        angle = body.angle
+                        velocity = body.velocity
+                        speed = math.hypot(velocity.x, velocity.y) + abs(body.angular_velocity) * BLOCK_RADIUS
+                        if speed > fastest:
+                            fastest = speed
+                        pose = (position.x, position.y, math.cos(angle), math.sin(angle))
+                        poses[body] = pose
+                    px, py, cos, sin = pose
+                    anchor = (px + x * cos - y * sin, py + x * sin + y * cos)
+                    if previous is not None:
+                        error = abs(math.hypot(anchor[0] - previous[0], anchor[1] - previous[1])
+                                    - joints[index - 1].distance)
+                        if error > worst:
+                            worst = error
+                    previous = anchor
+        return fastest, worst
+
+    def maxTravel(self):
+        """Largest distance any dynamic body would move in one whole frame."""
+        fastest = 0.0
+        ignored = self.ignored
+        for body in self.space.bodies:
+            if body in ignored:
+                continue
+            speed = body.velocity.length + abs(body.angular_velocity) * BLOCK_RADIUS
+            if speed > fastest:
+                fastest = speed
+        return fastest * self.frameTime
+
+    def maxJointError(self):
+        worst = 0.0
+        for constraint in self.space.constraints:
+            if isinstance(constraint, pm.PinJoint):
+                a = constraint.a.local_to_world(constraint.anchor_a)
+                b = constraint.b.local_to_world(constraint.anchor_b)
+                error = abs((a - b).length - constraint.distance)
+                if error > worst:
+                    worst = error
+        return worst
+
+    def chooseSubsteps(self):
+        if self.fighters:
+            fastest, error = self.fighterMotion()
+            travel = fastest * self.frameTime
+        else:
+            travel = self.maxTravel()
+            error = self.maxJointError()
+        substeps = int(math.ceil(travel / MAX_TRAVEL))
+        if error > MAX_JOINT_ERROR:
+            self.space.iterations = self.errorIterations
+            substeps += int(math.ceil(error / MAX_JOINT_ERROR))
+        else:
+            self.space.iterations = self.iterations
+        return min(self.maxSubsteps, max(self.minSubsteps, substeps))
+
+    def stepFrame(self):
+        """Advance exactly one frame and return the number of substeps it used."""
+        if self.due or self.frame % RECHECK_FRAMES == 0:
+            self.substeps = self.chooseSubsteps()
+            self.due = False
+        substeps = self.substeps
+        dt = self.frameTime / substeps
+        for x in range(substeps):
+            self.substep = x
+            self.space.step(dt)
+        self.frame += 1
+        return substeps
+
+    def framesDue(self, elapsed):
+        """Add elapsed seconds of real time and return how many whole frames are due.
+
+        At most maxFramesPerAdvance frames are due at once so a slow machine falls
+        behind instead of spiralling. The caller must run them with stepFrame.
+        """
+        self.accumulator += elapsed
+        frames = int(self.accumulator / self.frameTime)
+        if frames > self.maxFramesPerAdvance:
+            frames = self.maxFramesPerAdvance
+            # Drop the time we can't catch up on
+            self.accumulator = frames * self.frameTime
+        self.accumulator -= frames * self.frameTime
+        return frames
@@ -0,0 +1,158 @@
+# File: Tournament.py
+# Round-robin tournaments of headless matches spread over a process pool
+
+import argparse
+import collections
+import concurrent.futures
+import json
+import os
+import random
+from concurrent.futures.process import BrokenProcessPool
+import Bots
+import Character
+import Headless
+
+# Entrants used when no entrants file is given. Each entrant is a random policy
+# limited to some of the fighter's actions, taken on about rate of the frames, or
+# one of Bots.BOTS when it names a "bot".
+DEFAULT_ENTRANTS = (
+    {"name": "brawler", "rate": 0.2},
+    {"name": "kicker", "rate": 0.3, "actions": ["kickRFoot", "reverseKickRFoot", "kickLFoot", "reverseKickLFoot"]},
+    {"name": "boxer", "rate": 0.3, "actions": ["punchRight", "reversePunchRight", "punchLeft", "reversePunchLeft"]},
+    {"name": "lazy", "rate": 0.05},
+    {"name": "rules", "bot": "rule"}
+)
+
+
+def matchSeed(seed, match):
+    """Seed for one match that only depends on the tournament seed and the match number."""
+    return random.Random("%d:%d" % (seed, match)).getrandbits(32)
+
+
+def schedule(entrants, rounds):
+    """Every ordered pair of different entrants, so everyone plays both sides, rounds times."""
+    matches = []
+    for x in range(rounds):
+        for one in range(len(entrants)):
+            for two in range(len(entrants)):
+                if one != two:
+                    matches.append((len(matches), one, two))
+    return matches
+
+
+def makePolicy(entrant, seed, player):
+    if "bot" in entrant:
+        return Bots.BOTS[entrant["bot"]](player)
+    return Headless.randomPolicy(seed, entrant.get("rate", 0.2), entrant.get("actions", Character.ACTIONS))
+
+
+def playMatch(job):
+    """Worker side: play one match and return its result as a dictionary."""
+    match, playerOne, playerTwo, seed, maxFrames = job
+    rng = random.Random(seed)
+    result = Headless.runMatch(makePolicy(playerOne, rng.getrandbits(32), 1),
+                               makePolicy(playerTwo, rng.getrandbits(32), 2), maxFrames)
+    record = result.asDict()
+    record.update({"match": match, "seed": seed, "playerOne": playerOne["name"], "playerTwo": playerTwo["name"]})
+    return record
+
+
+def finishedMatches(path):
+    """Numbers of the matches already played in a results file, so a tournament can be resumed.
+
+    Matches written with an error, a crashed worker included, don't count and are played again.
+    """
+    finished = set()
+    if os.path.exists(path):
+        with open(path) as results:
+            for line in results:
+                if line.strip():
+                    record = json.loads(line)
+                    if "error" not in record:
+                        finished.add(record["match"])
+    return finished
+
+
+def runTournament(entrants, path, rounds=1, seed=0, workers=None, maxFrames=Headless.MAX_FRAMES, maxRetries=2):
+    """Play every scheduled match and append one JSON line per match to path as it finishes.
+
+    Matches already played in path are skipped. If a worker process dies the pool is restarted and the
+    matches that were running are retried one at a time, so only the match that crashes keeps
+    failing; after maxRetries it is written with an error.
+    Returns the number of wins of every entrant in this run.
+    """
+    workers = workers or os.cpu_count()
+    finished = finishedMatches(path)
+    pending = collections.deque((match, entrants[one], entrants[two], matchSeed(seed, match), maxFrames)
+                                for match, one, two in schedule(entrants, rounds) if match not in finished)
+    attempts = collections.Counter()
+    wins = collections.Counter()
+
+    with open(path, "a") as results:
+        def write(record):
+            results.write(json.dumps(record) + "\n")
+            results.flush()
+            if record.get("winner") == 1:
+                wins[record["playerOne"]] += 1
+            elif record.get("winner") == 2:
+                wins[record["playerTwo"]] += 1
+
+        while pending:
+            running = {}
+            try:
+                with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+                    # Keep a few jobs queued per worker instead of submitting the whole schedule
+                    while pending or running:
+                        while pending and len(running) < workers * 4:
+                            # Matches that were running during a crash go on their own
+                            if any(attempts[job[0]] for job in running.values()):
+                                break
+                            if attempts[pending[0][0]] and running:
+                                break
+                            job = pending.popleft()
+                            running[pool.submit(playMatch, job)] = job
+                        done, notDone = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                        for future in done:
+                            error = future.exception()
+                            if isinstance(error, BrokenProcessPool):
+                                raise error
+                            job = running.pop(future)
+                            if error is not None:
+                                write({"match": job[0], "seed": job[3], "playerOne": job[1]["name"],
+                                       "playerTwo": job[2]["name"], "error": repr(error)})
+                            else:
+                                write(future.result())
+            except BrokenProcessPool:
+                for job in running.values():
+                    attempts[job[0]] += 1
+                    if attempts[job[0]] > maxRetries:
+                        write({"match": job[0], "seed": job[3], "playerOne": job[1]["name"],
+                               "playerTwo": job[2]["name"], "error": "worker crashed"})
+                    else:
+                        pending.appendleft(job)
+
+    return wins
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a round-robin Block Fight tournament without a display")
+    parser.add_argument("--entrants", help="JSON file with a list of entrants, see DEFAULT_ENTRANTS")
+    parser.add_argument("--rounds", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--frames", type=int, default=Headless.MAX_FRAMES, help="frame limit per match")
+    parser.add_argument("--out", default="tournament.jsonl", help="results file, appended to and resumed from")
+    args = parser.parse_args()
+
+    entrants = DEFAULT_ENTRANTS
+    if args.entrants:
+        with open(args.entrants) as entrantsFile:
+            entrants = json.load(entrantsFile)
+
+    wins = runTournament(entrants, args.out, args.rounds, args.seed, args.workers, args.frames)
+    for entrant in entrants:
+        print(entrant["name"], wins[entrant["name"]])
+
+
+if __name__ == '__main__':
+    main()
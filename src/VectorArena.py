@@ -0,0 +1,90 @@
+# File: VectorArena.py
+# Many independent headless arenas driven together, for AI training and balance sweeps
+
+import numpy as np
+import Arena
+import Character
+import Headless
+import StateTable
+
+# Observation values for every part of every fighter, in this order
+OBSERVATION_FIELDS = StateTable.FIELDS
+PART_NAMES = StateTable.PART_NAMES
+HEALTH = OBSERVATION_FIELDS.index("health")
+
+# Action 0 does nothing, action i + 1 is Character.ACTIONS[i]
+NO_ACTION = 0
+ACTION_COUNT = len(Character.ACTIONS) + 1
+
+WIN_REWARD = 100.0
+
+
+class VectorArena():
+    """count arenas stepped in lockstep.
+
+    step() takes an int array of shape (count, 2) with one action per fighter and returns
+    (observations, rewards, dones). Observations have shape (count, 2, parts, fields), see
+    OBSERVATION_FIELDS. A fighter's reward is the health its opponent lost minus the health it
+    lost, plus WIN_REWARD for winning. Arenas that finished, or were never reset, are reset on
+    the next step.
+
+    Each arena's StateTable fills its slice of the observation array in place, so observing
+    copies nothing. The array is overwritten by the next step; copy it to keep it.
+    """
+    def __init__(self, count, size=Arena.ARENA_SIZE, maxFrames=Headless.MAX_FRAMES):
+        self.count = count
+        self.size = size
+        self.maxFrames = maxFrames
+        self.arenas = [None] * count
+        self.health = np.zeros((count, 2))
+        self.dones = np.zeros(count, dtype=bool)
+        self.observations = np.zeros((count, 2, len(PART_NAMES), len(OBSERVATION_FIELDS)))
+
+    def resetArena(self, index):
+        arena = self.arenas[index]
+        if arena is None:
+            arena = Arena.Arena(size=self.size)
+            arena.stateTable(self.observations[index])
+            self.arenas[index] = arena
+        else:
+            arena.reset()
+        self.health[index] = self.observations[index, :, :, HEALTH].sum(axis=1)
+        self.dones[index] = False
+
+    def reset(self):
+        for index in range(self.count):
+            self.resetArena(index)
+        return self.observe()
+
+    def observe(self):
+        """The observation array, kept up to date by the arenas' state tables."""
+        return self.observations
+
+    def step(self, actions):
+        actions = np.asarray(actions, dtype=int).reshape(self.count, 2)
+        if ((actions < 0) | (actions >= ACTION_COUNT)).any():
+            raise ValueError("Actions must be from 0 to %d: %s" % (ACTION_COUNT - 1, actions.tolist()))
+        for index in range(self.count):
+            if self.dones[index] or self.arenas[index] is None:
+                self.resetArena(index)
+            arena = self.arenas[index]
+            for player in (1, 2):
+                action = actions[index, player - 1]
+                if action != NO_ACTION:
+                    arena.act(player, Character.ACTIONS[action - 1])
+            arena.step()
+
+        health = self.observations[..., HEALTH].sum(axis=2)
+        lost = self.health - health
+        self.health = health
+        rewards = lost[:, ::-1] - lost
+
+        winners = np.array([arena.winner() for arena in self.arenas])
+        rewards[winners == 1] += (WIN_REWARD, -WIN_REWARD)
+        rewards[winners == 2] += (-WIN_REWARD, WIN_REWARD)
+        self.dones = np.array([arena.isOver() or arena.frame >= self.maxFrames for arena in self.arenas])
+        return self.observe(), rewards, self.dones.copy()
+
+    def results(self):
+        """Winner of every arena, 0 while undecided."""
+        return np.array([0 if arena is None else arena.winner() for arena in self.arenas])